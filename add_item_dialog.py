@@ -17,6 +17,7 @@ class AddItemDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("新增库存物品")
         self.db_path = db_path
+        self.new_row = None # 添加成功后的物品数据，供库存页面局部插入
         
         self.init_ui()
 
@@ -151,6 +152,17 @@ class AddItemDialog(QDialog):
             )
             
             if new_id is not None:
+                self.new_row = {
+                    'id': new_id,
+                    'name': data['name'].strip(),
+                    'reference': data['reference'].strip(),
+                    'category': data['category'].strip(),
+                    'domain': data['domain'].strip(),
+                    'unit': data['unit'].strip(),
+                    'current_stock': data['current_stock'],
+                    'min_stock': data['min_stock'],
+                    'location': data['location'].strip()
+                }
                 QMessageBox.information(self, "成功", f"物品 '{data['name']}' (ID: {new_id}) 添加成功！")
                 super().accept()
             else:
@@ -27,6 +27,7 @@ class BatchEditDialog(QDialog):
         self.setMinimumWidth(500)
         self.db_path = db_path
         self.selected_items = selected_items
+        self.updated_rows = [] # 更新成功的物品数据，供库存页面局部刷新
         
         self.init_ui()
 
@@ -223,44 +224,27 @@ class BatchEditDialog(QDialog):
         if reply != QMessageBox.StandardButton.Yes:
             return
         
-        # 执行批量更新
-        success_count = 0
-        failed_count = 0
+        # 只收集勾选的字段，所有选中物品一次事务更新 (UPDATE ... WHERE id IN (...))
+        changes = {}
+        if self.category_checkbox.isChecked():
+            changes['category'] = self.category_combo.currentText()
+        if self.domain_checkbox.isChecked():
+            changes['domain'] = self.domain_combo.currentText()
+        if self.unit_checkbox.isChecked():
+            changes['unit'] = self.unit_combo.currentText()
+        if self.min_stock_checkbox.isChecked():
+            changes['min_stock'] = self.min_stock_spin.value()
+        if self.location_checkbox.isChecked():
+            changes['location'] = self.location_combo.currentText()
         
-        for item in self.selected_items:
-            try:
-                item_id = item['id']
-                name = item['name']
-                reference = item['reference']
-                
-                # 确定要更新的值
-                category = self.category_combo.currentText() if self.category_checkbox.isChecked() else item.get('category', '其他')
-                # 获取 domain 字段值，如果未选中，保留原值（默认为 '其他'）
-                domain = self.domain_combo.currentText() if self.domain_checkbox.isChecked() else item.get('domain', '其他') 
-                unit = self.unit_combo.currentText() if self.unit_checkbox.isChecked() else item['unit']
-                min_stock = self.min_stock_spin.value() if self.min_stock_checkbox.isChecked() else item['min_stock']
-                location = self.location_combo.currentText() if self.location_checkbox.isChecked() else item['location']
-                
-                # 调用数据库更新
-                if db_manager.update_inventory_item(
-                    db_path=self.db_path,
-                    item_id=item_id,
-                    name=name,
-                    reference=reference,
-                    category=category,
-                    domain=domain,  # 传递 domain 字段
-                    unit=unit,
-                    min_stock=min_stock,
-                    location=location
-                ):
-                    success_count += 1
-                else:
-                    failed_count += 1
-                    print(f"更新失败：{name} (ID: {item_id})")
-                    
-            except Exception as e:
-                failed_count += 1
-                print(f"更新物品时发生错误：{e}")
+        item_ids = [item['id'] for item in self.selected_items]
+        success_count, failed_ids = db_manager.batch_update_inventory(self.db_path, item_ids, changes)
+        failed_count = len(failed_ids)
+        for item_id in failed_ids:
+            print(f"更新失败：ID {item_id}")
+        
+        failed = set(failed_ids)
+        self.updated_rows = [{**item, **changes} for item in self.selected_items if item['id'] not in failed]
         
         # 显示结果
         if failed_count == 0:
@@ -297,6 +281,12 @@ if __name__ == '__main__':
             # 模拟数据库更新成功
             return True
 
+        @staticmethod
+        def batch_update_inventory(db_path, item_ids, changes):
+            # 模拟批量更新全部成功
+            print(f"--- Mock DB Batch Update --- IDs: {item_ids}, Changes: {changes}")
+            return len(item_ids), []
+
     db_manager = MockDBManager()
     app = QApplication(sys.argv)
     
@@ -11,6 +11,25 @@ from typing import Optional, List, Dict, Union
 from datetime import datetime
 # 确保导入 db_manager 并正确引用 DB_NAME
 import db_manager 
+from db_worker import run_in_background
+
+
+def _record_rows(db_path: str, type: str, date: str, recipient_source: str, rows: List[tuple]) -> List[tuple]:
+    """
+    在后台线程中逐行记录交易 (每行一个事务，与原先逐行提交的语义一致)。
+    rows 为 (行号, 型号, 物品ID, 数量, 项目) 列表；返回 (行号, 成功与否, 异常信息或 None) 列表。
+    """
+    results = []
+    for r, _, item_id, qty, project_ref in rows:
+        try:
+            success = db_manager.record_transaction(
+                db_path=db_path, item_id=item_id, type=type, quantity=qty, date=date,
+                recipient_source=recipient_source, project_ref=project_ref
+            )
+            results.append((r, success, None))
+        except Exception as e:
+            results.append((r, False, str(e)))
+    return results
 
 # =================================================================
 # 辅助类：ItemReferenceCombo 和 ProjectCombo (保持不变)
@@ -45,6 +64,9 @@ class BatchTransactionDialog(QDialog):
         
         self.setMinimumWidth(1100) # 增大宽度以容纳更多字段
         self.locked_rows: Dict[int, str] = {} 
+        self._save_task = None # 进行中的后台写入任务
+        self._rows_to_record: Dict[int, tuple] = {} # 行号 -> 待写入的交易
+        self._failed_transactions: List[str] = []
         
         # 使用 db_manager.get_all_inventory 获取数据
         self.all_inventory_items: List[Dict] = db_manager.get_all_inventory(self.db_path)
@@ -145,9 +167,9 @@ class BatchTransactionDialog(QDialog):
              self.location_filter.addItem("无可用物品")
              self.domain_filter.addItem("无可用物品")
              return
-        categories = sorted(list(set(item.get('category', '').strip() for item in self.all_inventory_items if item.get('category'))))
-        locations = sorted(list(set(item.get('location', '').strip() for item in self.all_inventory_items if item.get('location'))))
-        domains = sorted(list(set(item.get('domain', '').strip() for item in self.all_inventory_items if item.get('domain'))))
+        categories = sorted({value for item in self.all_inventory_items if (value := (item.get('category') or '').strip())})
+        locations = sorted({value for item in self.all_inventory_items if (value := (item.get('location') or '').strip())})
+        domains = sorted({value for item in self.all_inventory_items if (value := (item.get('domain') or '').strip())})
 
         self.category_filter.addItem("全部类别")
         self.category_filter.addItems(categories)
@@ -393,7 +415,7 @@ class BatchTransactionDialog(QDialog):
 
 
     def accept_action(self):
-        # ... (批量交易执行逻辑，保持不变)
+        # ... (批量交易执行逻辑)
         if not self.ok_button.isEnabled():
             QMessageBox.critical(self, "错误", "数据校验未通过，请检查列表中的红色错误项并填写来源/接收人。")
             return
@@ -402,69 +424,108 @@ class BatchTransactionDialog(QDialog):
         current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         row_count = self.transaction_table.rowCount()
 
-        successful_count = 0
         failed_transactions = []
+        rows_to_record = [] # (行号, 型号, 物品ID, 数量, 项目)
         
+        # 在事务开始前，重新拉取最新的库存信息，以防两个批量对话框同时操作
+        current_inventory = db_manager.get_all_inventory(self.db_path)
+        self.inventory_map = {item.get('reference', ''): dict(item) for item in current_inventory}
+
+        for r in range(row_count):
+            status_item_check = self.transaction_table.item(r, 5) 
+            if status_item_check is None or not status_item_check.data(Qt.ItemDataRole.UserRole):
+                failed_transactions.append(f"行 {r+1}: 预校验失败，跳过。")
+                continue 
+
+            ref = ""
+            try:
+                item_combo: ItemReferenceCombo = self.transaction_table.cellWidget(r, 1) 
+                quantity_spin: QSpinBox = self.transaction_table.cellWidget(r, 2) 
+                project_widget: QWidget = self.transaction_table.cellWidget(r, 4) 
+                
+                ref = item_combo.currentText()
+                qty = quantity_spin.value()
+                
+                project_ref = ""
+                if self.type == 'OUT':
+                    project_combo: ProjectCombo = project_widget
+                    project_ref = project_combo.currentText().strip()
+                
+                item = self.inventory_map.get(ref)
+                if not item: 
+                    failed_transactions.append(f"行 {r+1} ({ref}): 型号不存在或查询失败。")
+                    continue
+                    
+                rows_to_record.append((r, ref, item['id'], qty, project_ref))
+
+            except Exception as e:
+                self._mark_row_error(r, ref, e, failed_transactions)
+
+        # 写入在后台线程执行 (提交时的 fsync 不阻塞 UI)，期间禁用按钮并显示等待光标
+        self._failed_transactions = failed_transactions
+        self._rows_to_record = {row[0]: row for row in rows_to_record}
+        self.buttonBox.setEnabled(False)
         QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor) 
+        self._save_task = run_in_background(
+            _record_rows, self.db_path, self.type, current_datetime, recipient_source, rows_to_record,
+            on_finished=self._on_save_finished,
+            on_failed=self._on_save_failed
+        )
+
+    def _mark_row_error(self, r: int, ref: str, error, failed_transactions: List[str]):
+        failed_transactions.append(f"行 {r+1} ({ref}): 发生未知错误 - {error}")
+        status_item: QTableWidgetItem = self.transaction_table.item(r, 5)
+        status_item.setText("❌ 失败: 未知错误")
+        status_item.setBackground(Qt.GlobalColor.red)
+
+    def reject(self):
+        # 后台写入进行中时忽略 Esc / 取消，否则写入已提交而调用方却收到 Rejected
+        if self._save_task is not None:
+            return
+        super().reject()
+
+    def closeEvent(self, event):
+        # 后台写入进行中时忽略窗口关闭按钮
+        if self._save_task is not None:
+            event.ignore()
+            return
+        super().closeEvent(event)
+
+    def _on_save_failed(self, error: str):
+        """后台写入抛出异常 (UI 线程)：所有待写入的行视为失败。"""
+        self._on_save_finished([(r, False, error) for r in self._rows_to_record])
+
+    def _on_save_finished(self, results: List[tuple]):
+        """后台写入完成 (UI 线程)：更新每行状态并汇总结果。"""
+        self._save_task = None
+        QApplication.restoreOverrideCursor() 
+        self.buttonBox.setEnabled(True)
         
-        try:
-            # 在事务开始前，重新拉取最新的库存信息，以防两个批量对话框同时操作
-            current_inventory = db_manager.get_all_inventory(self.db_path)
-            self.inventory_map = {item.get('reference', ''): dict(item) for item in current_inventory}
-
-            for r in range(row_count):
-                status_item_check = self.transaction_table.item(r, 5) 
-                if status_item_check is None or not status_item_check.data(Qt.ItemDataRole.UserRole):
-                    failed_transactions.append(f"行 {r+1}: 预校验失败，跳过。")
-                    continue 
-
-                try:
-                    item_combo: ItemReferenceCombo = self.transaction_table.cellWidget(r, 1) 
-                    quantity_spin: QSpinBox = self.transaction_table.cellWidget(r, 2) 
-                    project_widget: QWidget = self.transaction_table.cellWidget(r, 4) 
-                    
-                    ref = item_combo.currentText()
-                    qty = quantity_spin.value()
-                    
-                    project_ref = ""
-                    if self.type == 'OUT':
-                        project_combo: ProjectCombo = project_widget
-                        project_ref = project_combo.currentText().strip()
-                    
-                    item = self.inventory_map.get(ref)
-                    if not item: 
-                        failed_transactions.append(f"行 {r+1} ({ref}): 型号不存在或查询失败。")
-                        continue
-                        
-                    item_id = item['id']
-                    
-                    success = db_manager.record_transaction(
-                        db_path=self.db_path, item_id=item_id, type=self.type, quantity=qty, date=current_datetime,
-                        recipient_source=recipient_source, project_ref=project_ref
-                    )
-                    
-                    status_item: QTableWidgetItem = self.transaction_table.item(r, 5)
-                    
-                    if success:
-                        successful_count += 1
-                        status_item.setText("✅ 成功")
-                        status_item.setBackground(Qt.GlobalColor.green)
-                        
-                        # 仅更新 UI 内存中的库存，不影响 DB
-                        item['current_stock'] = item.get('current_stock', 0) + (qty if self.type=='IN' else -qty)
-                        
-                    else:
-                        failed_transactions.append(f"行 {r+1} ({ref}): 数据库更新失败 (可能库存不足)。")
-                        status_item.setText("❌ 失败: 库存或DB错误")
-                        status_item.setBackground(Qt.GlobalColor.yellow)
-
-                except Exception as e:
-                    failed_transactions.append(f"行 {r+1} ({ref}): 发生未知错误 - {e}")
-                    status_item: QTableWidgetItem = self.transaction_table.item(r, 5)
-                    status_item.setText("❌ 失败: 未知错误")
-                    status_item.setBackground(Qt.GlobalColor.red)
-        finally:
-            QApplication.restoreOverrideCursor() 
+        row_count = self.transaction_table.rowCount()
+        failed_transactions = self._failed_transactions
+        successful_count = 0
+        
+        for r, success, error in results:
+            _, ref, _, qty, _ = self._rows_to_record[r]
+            if error is not None:
+                self._mark_row_error(r, ref, error, failed_transactions)
+                continue
+            
+            status_item: QTableWidgetItem = self.transaction_table.item(r, 5)
+            
+            if success:
+                successful_count += 1
+                status_item.setText("✅ 成功")
+                status_item.setBackground(Qt.GlobalColor.green)
+                
+                # 仅更新 UI 内存中的库存，不影响 DB
+                item = self.inventory_map[ref]
+                item['current_stock'] = item.get('current_stock', 0) + (qty if self.type=='IN' else -qty)
+                
+            else:
+                failed_transactions.append(f"行 {r+1} ({ref}): 数据库更新失败 (可能库存不足)。")
+                status_item.setText("❌ 失败: 库存或DB错误")
+                status_item.setBackground(Qt.GlobalColor.yellow)
 
         total_transactions = row_count
         
@@ -6,7 +6,7 @@ CSV 导入导出工具模块
 
 import csv
 import logging
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Iterable, Mapping
 from pathlib import Path
 
 # 配置日志
@@ -79,6 +79,68 @@ def export_to_csv(
         return False
 
 
+def export_rows_to_csv(
+    rows: Iterable[Mapping], 
+    filepath: str, 
+    headers: List[str]
+) -> int:
+    """
+    将逐行产出的数据 (字典或 sqlite3.Row 等支持按列名取值的对象) 流式写入 CSV 文件，
+    边读边写，不把全部数据读入内存。
+    
+    :param rows: 数据行的可迭代对象 (如数据库游标的生成器)。
+    :param filepath: 目标 CSV 文件路径。
+    :param headers: CSV 文件的表头/列名列表，同时决定每行取值的列。
+    :return: 写入的数据行数；没有数据时返回 0 (不创建文件)，读取或写入失败返回 -1
+             (已开始写入的不完整文件会被删除)。
+    """
+    filepath = Path(filepath)
+    opened = False # 文件已打开 (已截断或新建) 后，失败时删除不完整的文件
+    
+    try:
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            logger.warning("没有数据，无法导出。")
+            return 0
+        
+        # 确保父目录存在
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        
+        # 使用 utf-8-sig 编码，确保 Excel 正确显示中文
+        with open(filepath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            opened = True
+            writer = csv.writer(csvfile)
+            writer.writerow(headers)
+            writer.writerow([first[key] for key in headers])
+            count = 1
+            for row in rows:
+                writer.writerow([row[key] for key in headers])
+                count += 1
+        
+        logger.info(f"成功导出 {count} 条记录到 {filepath}")
+        return count
+        
+    except (IOError, OSError) as e:
+        logger.error(f"无法写入文件 {filepath}: {e}")
+        if opened:
+            _remove_partial_file(filepath)
+        return -1
+    except Exception as e:
+        logger.error(f"导出 CSV 失败: {e}")
+        if opened:
+            _remove_partial_file(filepath)
+        return -1
+
+
+def _remove_partial_file(filepath: Path):
+    """删除导出失败时留下的不完整文件，避免被误当作完整的导出结果。"""
+    try:
+        filepath.unlink(missing_ok=True)
+    except OSError as e:
+        logger.error(f"无法删除不完整的导出文件 {filepath}: {e}")
+
+
 def import_from_csv(filepath: str) -> List[Dict[str, Union[str, int]]]:
     """
     从 CSV 文件导入库存数据，返回一个字典列表。
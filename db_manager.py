@@ -3,8 +3,12 @@
 # 负责初始化数据库、CRUD 操作、交易记录等功能。
 import sqlite3
 import hashlib
-from typing import List, Dict, Union, Optional
-from datetime import datetime
+import re
+import threading
+import time
+import atexit
+from typing import List, Dict, Union, Optional, Tuple, Iterator
+from datetime import datetime, timedelta
 import os
 
 # 假设项目中存在 data_utility.py 用于处理文件IO (用于导入导出功能)
@@ -27,42 +31,169 @@ def _connect_db(db_path: str = DB_NAME) -> sqlite3.Connection:
     """内部函数：连接到 SQLite 数据库并设置行工厂。"""
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row # 使查询结果以字典形式返回
+    conn.execute("PRAGMA foreign_keys = ON") # 外键约束需按连接单独开启 (ON DELETE CASCADE 依赖此项)
     return conn
 
+# --- 持久连接 ---
+# 每个线程、每个数据库文件各保留一个长连接，避免每次调用都重新打开文件并预热页缓存。
+# 连接在程序退出时统一关闭。线程池线程空闲后会退出并被新线程替换，
+# 其连接由 db_worker 在每个任务结束时通过 release_thread_connections 关闭，不长期保留。
+
+_CONN_CACHE: Dict[Tuple[int, str], sqlite3.Connection] = {}
+_STATEMENT_CACHE_SIZE = 256 # 每个长连接缓存的已编译语句数 (默认 128)
+_conn_cache_lock = threading.Lock()
+
+def apply_pragmas(conn: sqlite3.Connection):
+    """长连接的统一 PRAGMA 设置 (login.py 的连接也使用)。"""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA cache_size = -20000") # 约 20MB 页缓存
+    conn.execute("PRAGMA temp_store = MEMORY") # 排序/临时表放在内存中
+
+def get_conn(db_path: str) -> sqlite3.Connection:
+    """获取当前线程对应 db_path 的长连接 (首次调用时创建)，行工厂为 sqlite3.Row。调用方不要关闭它。"""
+    key = (threading.get_ident(), db_path)
+    conn = _CONN_CACHE.get(key)
+    if conn is None:
+        # check_same_thread=False 仅为了退出时能在主线程关闭；每个连接只在创建它的线程中使用
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=_STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        with _conn_cache_lock:
+            _CONN_CACHE[key] = conn
+    return conn
+
+def release_thread_connections():
+    """关闭并移除当前线程的所有长连接 (线程池任务结束时调用)。"""
+    ident = threading.get_ident()
+    with _conn_cache_lock:
+        conns = [_CONN_CACHE.pop(key) for key in list(_CONN_CACHE) if key[0] == ident]
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+def get_data_version(db_path: str) -> Tuple[int, int]:
+    """
+    返回当前线程长连接所见的数据版本 (PRAGMA data_version, total_changes)。
+    data_version 在其他连接提交修改后变化，total_changes 记录本连接自身的修改；
+    两者都未变时数据库内容未变。WAL 模式下写入先进入 -wal 文件，不能用主库文件的 mtime 判断。
+    """
+    conn = get_conn(db_path)
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+def _close_all_connections():
+    """
+    程序退出时关闭所有长连接。每个数据库只在一个连接上执行一次 PRAGMA optimize
+    (SQLite 仅在统计信息过期时才增量执行 ANALYZE，平时几乎没有开销)。
+    """
+    with _conn_cache_lock:
+        items = list(_CONN_CACHE.items())
+        _CONN_CACHE.clear()
+    optimized = set()
+    for (_, db_path), conn in items:
+        try:
+            if db_path not in optimized:
+                optimized.add(db_path)
+                conn.execute("PRAGMA optimize")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+atexit.register(_close_all_connections)
+
+# --- 写事务 ---
+
+class _RollbackWith(Exception):
+    """写任务内部使用：回滚该任务的全部修改，但仍向调用方返回 value。"""
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def _run_write(db_path: str, func, *args):
+    """
+    在当前线程的长连接上以 BEGIN IMMEDIATE 事务执行写任务 func(conn, *args)，成功则提交。
+    func 不得自行 commit/rollback；需要放弃修改时抛出异常或 _RollbackWith。
+    """
+    conn = get_conn(db_path)
+    if conn.in_transaction:
+        # 长连接上残留的未提交事务不属于本任务，丢弃后再开始新事务，避免替他人提交或在无写锁时执行
+        conn.rollback()
+    conn.execute("BEGIN IMMEDIATE") # 先取得写锁，读取库存与写入之间不会插入其他写者
+    try:
+        result = func(conn, *args)
+    except _RollbackWith as r:
+        conn.rollback()
+        return r.value
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return result
+
 # --- 数据库初始化和用户管理 ---
 
+# 静态建表语句：无参数，由 initialize_database 通过一次 executescript 执行
+SCHEMA_SQL = """
+    -- 1. 管理员用户表
+    CREATE TABLE IF NOT EXISTS admin_user (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    );
+
+    -- 2. Inventory 表 (物品库存)
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        reference TEXT UNIQUE,
+        category TEXT,
+        domain TEXT,
+        unit TEXT,
+        current_stock INTEGER NOT NULL DEFAULT 0,
+        min_stock INTEGER NOT NULL DEFAULT 0,
+        location TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(name);
+
+    -- 3. Transactions 表 (交易记录)
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        type TEXT NOT NULL CHECK(type IN ('IN', 'OUT', 'REVERSAL-IN', 'REVERSAL-OUT')),
+        quantity INTEGER NOT NULL,
+        recipient_source TEXT,
+        project_ref TEXT,
+        FOREIGN KEY (item_id) REFERENCES inventory(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+    CREATE INDEX IF NOT EXISTS idx_transactions_item_id ON transactions(item_id); -- 删除物品时级联删除交易记录按此索引查找
+
+    -- 4. Config 表 (存放自定义配置，如 Location, Unit, Project, Category, Domain 选项)
+    CREATE TABLE IF NOT EXISTS config (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        domain TEXT,
+        value TEXT NOT NULL,
+        UNIQUE(category, value)
+    );
+"""
+
 def initialize_database(db_path: str):
     """创建数据库文件，初始化 Inventory, Transactions, admin_user 和 config 表"""
     conn = None
     try:
         conn = sqlite3.connect(db_path)
+        
+        # 1. 所有静态 DDL 一次性执行 (单次解析/执行，而非逐条 execute)
+        conn.executescript(SCHEMA_SQL)
         cursor = conn.cursor()
         
-        # 1. 管理员用户表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin_user (
-                id INTEGER PRIMARY PRIMARY KEY,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL
-            )
-        """)
-        
-        # 2. Inventory 表 (物品库存)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS inventory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                reference TEXT UNIQUE,
-                category TEXT,
-                domain TEXT,
-                unit TEXT,
-                current_stock INTEGER NOT NULL DEFAULT 0,
-                min_stock INTEGER NOT NULL DEFAULT 0,
-                location TEXT
-            )
-        """)
-        
-        # 2.1. 检查并添加 'category' 字段 (用于迁移旧数据库)
+        # 2. 检查并添加 'category' 字段 (用于迁移旧数据库)
         try:
             cursor.execute("SELECT category FROM inventory LIMIT 1")
         except sqlite3.OperationalError:
@@ -72,7 +203,7 @@ def initialize_database(db_path: str):
             except sqlite3.OperationalError:
                 pass 
         
-        # 2.2. 检查并添加 'domain' 字段 (用于迁移旧数据库)
+        # 3. 检查并添加 'domain' 字段 (用于迁移旧数据库)
         try:
             cursor.execute("SELECT domain FROM inventory LIMIT 1")
         except sqlite3.OperationalError:
@@ -81,31 +212,6 @@ def initialize_database(db_path: str):
                 cursor.execute("ALTER TABLE inventory ADD COLUMN domain TEXT DEFAULT '其他'")
             except sqlite3.OperationalError:
                 pass
-        
-        # 3. Transactions 表 (交易记录)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                item_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                type TEXT NOT NULL CHECK(type IN ('IN', 'OUT', 'REVERSAL-IN', 'REVERSAL-OUT')), 
-                quantity INTEGER NOT NULL,
-                recipient_source TEXT,
-                project_ref TEXT,
-                FOREIGN KEY (item_id) REFERENCES inventory(id)
-            )
-        """)
-
-        # 4. Config 表 (存放自定义配置，如 Location, Unit, Project, Category, Domain 选项)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS config (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT NOT NULL,
-                domain TEXT, 
-                value TEXT NOT NULL,
-                UNIQUE(category, value) 
-            )
-        """)
 
         # 检查并插入初始管理员用户 (如果不存在)
         cursor.execute("SELECT id FROM admin_user WHERE username = 'admin'")
@@ -121,20 +227,88 @@ def initialize_database(db_path: str):
             'DOMAIN': ["强电", "弱电", "给排水", "暖通", "土建", "精装", "其他"],
             'PROJECT': ["项目A", "项目B", "维护保养", "行政采购"] # 新增默认项目
         }
-        for cat, values in default_configs.items():
-            for val in values:
-                 try:
-                    cursor.execute("INSERT INTO config (category, value) VALUES (?, ?)", (cat, val,))
-                 except sqlite3.IntegrityError:
-                     pass
+        cursor.executemany(
+            "INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)",
+            [(cat, val) for cat, values in default_configs.items() for val in values]
+        )
                      
         conn.commit()
+        
+        # 收集统计信息，保证 get_transactions_history 等多条件查询的执行计划稳定
+        cursor.execute("ANALYZE")
     except sqlite3.Error as e:
         print(f"数据库初始化错误: {e}")
     finally:
         if conn:
             conn.close()
 
+    # 旧数据库的结构迁移 (由 user_version 控制，仅执行一次)
+    migrate_database(db_path)
+
+
+# 当前数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 4
+
+def migrate_database(db_path: str):
+    """
+    根据 PRAGMA user_version 依次执行一次性结构迁移。
+    版本 1：transactions.item_id 外键增加 ON DELETE CASCADE (SQLite 需重建表)。
+    版本 2：transactions(date) 索引，供日期范围筛选使用。
+    版本 3：inventory(name) 索引，库存分页按 ORDER BY name, id 顺序扫描索引，无需每页全表排序。
+    版本 4：transactions(item_id) 索引，ON DELETE CASCADE 删除物品时按索引查找关联交易，而非每行全表扫描。
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.isolation_level = None # 手动控制事务
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='transactions' COLLATE NOCASE"
+        ).fetchone()
+        if row is None:
+            # 尚未建表的空库，交由建表流程处理
+            return
+
+        conn.execute("PRAGMA foreign_keys = OFF") # 重建期间关闭外键检查 (不能在事务内切换)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version < 1 and 'ON DELETE CASCADE' not in row[0].upper():
+                # 在原建表语句基础上修改，保留旧库的列定义与 CHECK 约束
+                new_sql = re.sub(r'CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?["`\[]?transactions["`\]]?',
+                                 'CREATE TABLE transactions_new', row[0], count=1, flags=re.IGNORECASE)
+                new_sql = re.sub(r'(REFERENCES\s+["`\[]?inventory["`\]]?\s*\(\s*["`\[]?id["`\]]?\s*\))',
+                                 r'\1 ON DELETE CASCADE', new_sql, count=1, flags=re.IGNORECASE)
+                if 'ON DELETE CASCADE' not in new_sql.upper():
+                    # 未能识别外键定义：回滚且不写入版本号，避免物品删除因外键约束失败
+                    raise sqlite3.DatabaseError("无法为 transactions.item_id 外键添加 ON DELETE CASCADE")
+                conn.execute(new_sql)
+                conn.execute("INSERT INTO transactions_new SELECT * FROM transactions")
+                conn.execute("DROP TABLE transactions")
+                conn.execute("ALTER TABLE transactions_new RENAME TO transactions")
+
+            if version < 2:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)")
+
+            if version < 3:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(name)")
+
+            if version < 4:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_item_id ON transactions(item_id)")
+
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        print(f"数据库迁移错误: {e}")
+    finally:
+        if conn:
+            conn.close()
+
 
 def check_admin_credentials(db_path: str, username: str, password: str) -> bool:
     """检查管理员用户名和密码是否匹配"""
@@ -182,22 +356,78 @@ def update_admin_password(db_path: str, new_password: str) -> bool:
             
 # --- Config 表管理函数 ---
 
+# 配置选项进程内缓存：(db_path, category) -> (读取时间, 选项列表)
+_OPTIONS_CACHE: Dict[Tuple[str, str], Tuple[float, List[str]]] = {}
+_OPTIONS_CACHE_TTL = 300 # 秒
+
+def invalidate_config_cache(category: Optional[str] = None):
+    """修改 config 表后调用，清除指定类别 (None 表示全部) 的选项缓存。"""
+    if category is None:
+        _OPTIONS_CACHE.clear()
+        return
+    for key in [key for key in _OPTIONS_CACHE if key[1] == category]:
+        _OPTIONS_CACHE.pop(key, None)
+
 def get_config_options(db_path: str, category: str) -> List[str]:
-    """根据 category 获取配置项列表 (例如: 'LOCATION', 'UNIT', 'CATEGORY', 'DOMAIN', 'PROJECT')"""
+    """
+    根据 category 获取配置项列表 (例如: 'LOCATION', 'UNIT', 'CATEGORY', 'DOMAIN', 'PROJECT')。
+    结果缓存 _OPTIONS_CACHE_TTL 秒，对话框反复打开时无需再查询数据库。
+    """
+    cached = _OPTIONS_CACHE.get((db_path, category))
+    if cached is not None and time.monotonic() - cached[0] < _OPTIONS_CACHE_TTL:
+        return list(cached[1])
+
     conn = None
     try:
-        conn = _connect_db(db_path) # 使用内部连接函数
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         
         cursor.execute("SELECT value FROM config WHERE category = ? ORDER BY value", (category,))
         
-        return [row[0] for row in cursor.fetchall()]
+        options = [row[0] for row in cursor.fetchall()]
+        _OPTIONS_CACHE[(db_path, category)] = (time.monotonic(), options)
+        return list(options)
     except sqlite3.Error as e:
         print(f"数据库错误：获取配置选项失败：{e}")
         return []
-    finally:
-        if conn:
-            conn.close()
+
+def get_config_options_bulk(db_path: str, categories: List[str]) -> Dict[str, List[str]]:
+    """
+    一次查询获取多个类别的配置项，返回 {category: [value, ...]}。
+    已缓存的类别直接取缓存，其余类别合并为一条 IN 查询。
+    """
+    now = time.monotonic()
+    result: Dict[str, List[str]] = {}
+    missing = []
+    for category in categories:
+        cached = _OPTIONS_CACHE.get((db_path, category))
+        if cached is not None and now - cached[0] < _OPTIONS_CACHE_TTL:
+            result[category] = list(cached[1])
+        else:
+            result[category] = []
+            missing.append(category)
+    if not missing:
+        return result
+
+    conn = None
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(missing))
+        cursor.execute(
+            f"SELECT category, value FROM config WHERE category IN ({placeholders}) ORDER BY category, value",
+            missing
+        )
+        for category, value in cursor.fetchall():
+            result[category].append(value)
+        
+        for category in missing:
+            _OPTIONS_CACHE[(db_path, category)] = (now, list(result[category]))
+        return result
+    except sqlite3.Error as e:
+        print(f"数据库错误：批量获取配置选项失败：{e}")
+        return result
 
 def insert_config_option(db_path: str, category: str, value: str) -> bool:
     """插入新的配置选项"""
@@ -209,6 +439,7 @@ def insert_config_option(db_path: str, category: str, value: str) -> bool:
         cursor.execute("INSERT INTO config (category, value) VALUES (?, ?)", (category, value.strip()))
         
         conn.commit()
+        invalidate_config_cache(category)
         return True
     except sqlite3.IntegrityError:
         return False
@@ -229,6 +460,7 @@ def delete_config_option(db_path: str, category: str, value: str) -> bool:
         cursor.execute("DELETE FROM config WHERE category = ? AND value = ?", (category, value))
         
         conn.commit()
+        invalidate_config_cache(category)
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         print(f"数据库错误：删除配置选项失败：{e}")
@@ -239,6 +471,13 @@ def delete_config_option(db_path: str, category: str, value: str) -> bool:
             
 # --- Inventory CRUD 操作 ---
 
+# 编辑保存时的 UPDATE 语句。作为模块常量传给长连接，
+# sqlite3 按 SQL 文本缓存已编译语句，重复保存时无需再解析/规划。
+SQL_UPDATE_ITEM = """
+    UPDATE inventory SET name=?, reference=?, category=?, domain=?, unit=?, min_stock=?, location=?
+    WHERE id=?
+"""
+
 def insert_inventory_item(
     db_path: str, 
     name: str, 
@@ -253,7 +492,7 @@ def insert_inventory_item(
     """插入新的库存物品。"""
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO inventory (name, reference, category, domain, unit, current_stock, min_stock, location) 
@@ -263,13 +502,13 @@ def insert_inventory_item(
         return cursor.lastrowid
     except sqlite3.IntegrityError:
         # print("错误：名称或参考编号已存在。")
+        conn.rollback()
         return None 
     except sqlite3.Error as e:
         print(f"数据库错误：插入物品失败：{e}")
-        return None
-    finally:
         if conn:
-            conn.close()
+            conn.rollback()
+        return None
 
 def update_inventory_item(
     db_path: str, 
@@ -285,65 +524,235 @@ def update_inventory_item(
     """更新库存物品的非库存字段。"""
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE inventory SET name=?, reference=?, category=?, domain=?, unit=?, min_stock=?, location=?
-            WHERE id=?
-        """, (name, reference, category, domain, unit, min_stock, location, item_id))
+        cursor.execute(SQL_UPDATE_ITEM, (name, reference, category, domain, unit, min_stock, location, item_id))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
         # print("错误：名称或参考编号已存在。")
+        conn.rollback()
         return False
     except sqlite3.Error as e:
         print(f"数据库错误：更新物品失败：{e}")
+        if conn:
+            conn.rollback()
         return False
-    finally:
+
+# update_inventory_item_partial 允许更新的列 (库存数量只能通过交易修改)
+_EDITABLE_ITEM_COLUMNS = ('name', 'reference', 'category', 'domain', 'unit', 'min_stock', 'location')
+
+def update_inventory_item_partial(db_path: str, item_id: int, **changes) -> bool:
+    """
+    只更新发生变化的非库存字段，例如 update_inventory_item_partial(db, 5, min_stock=10)。
+    未修改 reference 时不会触发其 UNIQUE 检查。没有可更新字段时直接返回 True。
+    """
+    unknown = [col for col in changes if col not in _EDITABLE_ITEM_COLUMNS]
+    if unknown:
+        print(f"数据库错误：更新物品失败：不允许更新的字段 {unknown}")
+        return False
+    if not changes:
+        return True
+
+    columns = [col for col in _EDITABLE_ITEM_COLUMNS if col in changes]
+    sql = f"UPDATE inventory SET {', '.join(col + '=?' for col in columns)} WHERE id=?"
+    params = [changes[col] for col in columns] + [item_id]
+
+    conn = None
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        conn.execute(sql, params)
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        # 名称或参考编号已存在
+        conn.rollback()
+        return False
+    except sqlite3.Error as e:
+        print(f"数据库错误：更新物品失败：{e}")
         if conn:
-            conn.close()
+            conn.rollback()
+        return False
+
+def batch_update_inventory(db_path: str, item_ids: List[int], changes: Dict[str, Union[int, str]]) -> Tuple[int, List[int]]:
+    """
+    在一个事务中把多个物品的相同字段改为相同的值 (批量编辑)：
+    UPDATE inventory SET col=?, ... WHERE id IN (...)，按 _IN_CHUNK_SIZE 分块。
+    返回 (更新成功数量, 失败的 ID 列表)；数据库出错时整体回滚，全部视为失败。
+    """
+    ids = list(dict.fromkeys(item_ids)) # 去重并保持顺序
+    unknown = [col for col in changes if col not in _EDITABLE_ITEM_COLUMNS]
+    if unknown:
+        print(f"数据库错误：批量更新物品失败：不允许更新的字段 {unknown}")
+        return 0, ids
+    if not ids or not changes:
+        return 0, ids
+
+    columns = [col for col in _EDITABLE_ITEM_COLUMNS if col in changes]
+    set_clause = ', '.join(col + '=?' for col in columns)
+    values = [changes[col] for col in columns]
+
+    conn = None
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        cursor = conn.cursor()
+        existing = set()
+        for i in range(0, len(ids), _IN_CHUNK_SIZE):
+            chunk = ids[i:i + _IN_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT id FROM inventory WHERE id IN ({placeholders})", chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"UPDATE inventory SET {set_clause} WHERE id IN ({placeholders})", values + chunk)
+
+        conn.commit()
+        return len(existing), [item_id for item_id in ids if item_id not in existing]
+    except sqlite3.Error as e:
+        print(f"数据库错误：批量更新物品失败：{e}")
+        if conn:
+            conn.rollback()
+        return 0, ids
 
 def delete_inventory_item(db_path: str, item_id: int) -> bool:
     """删除库存物品及所有相关交易记录。"""
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn(db_path) # 长连接已开启外键，关联的交易记录由 ON DELETE CASCADE 自动删除
         cursor = conn.cursor()
-        
-        # 1. 删除关联的交易记录
-        cursor.execute("DELETE FROM transactions WHERE item_id=?", (item_id,))
-        # 2. 删除库存项
         cursor.execute("DELETE FROM inventory WHERE id=?", (item_id,))
         
         conn.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         print(f"数据库错误：删除物品失败：{e}")
+        if conn:
+            conn.rollback()
         return False
-    finally:
+
+def delete_inventory_items(db_path: str, item_ids: List[int]) -> Tuple[int, List[int]]:
+    """
+    在一个事务中批量删除库存物品 (关联交易记录由 ON DELETE CASCADE 删除)。
+    返回 (删除成功数量, 删除失败的 ID 列表)；数据库出错时整体回滚，全部视为失败。
+    """
+    ids = list(dict.fromkeys(item_ids)) # 去重并保持顺序
+    if not ids:
+        return 0, []
+    conn = None
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        cursor = conn.cursor()
+        existing = set()
+        for i in range(0, len(ids), _IN_CHUNK_SIZE):
+            chunk = ids[i:i + _IN_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT id FROM inventory WHERE id IN ({placeholders})", chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"DELETE FROM inventory WHERE id IN ({placeholders})", chunk)
+
+        conn.commit()
+        return len(existing), [item_id for item_id in ids if item_id not in existing]
+    except sqlite3.Error as e:
         if conn:
-            conn.close()
+            conn.rollback()
+        print(f"数据库错误：批量删除物品失败：{e}")
+        return 0, ids
 
 def get_all_inventory(db_path: str) -> List[Dict[str, Union[int, str]]]:
     """获取所有库存物品数据"""
-    conn = None
     try:
-        conn = _connect_db(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM inventory ORDER BY name")
         return [dict(row) for row in cursor.fetchall()]
     except sqlite3.Error as e:
         print(f"数据库错误：获取库存失败：{e}")
         return []
-    finally:
-        if conn:
-            conn.close()
-            
+
+def _inventory_filter_clause(search: Optional[str] = None, category: Optional[str] = None,
+                             domain: Optional[str] = None, location: Optional[str] = None) -> Tuple[str, list]:
+    """根据搜索文本和下拉筛选构建 WHERE 子句及参数 (None 或 'ALL' 表示不筛选)"""
+    conditions = []
+    params = []
+    if search:
+        # 转义 LIKE 通配符，按字面匹配用户输入
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append("(name LIKE ? ESCAPE '\\' OR reference LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    for column, value in (('category', category), ('domain', domain), ('location', location)):
+        if value and value != 'ALL':
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+# 库存状态码: 0 正常 / 1 预警 / 2 缺货
+SQL_STOCK_STATUS = "CASE WHEN current_stock <= 0 THEN 2 WHEN current_stock <= min_stock THEN 1 ELSE 0 END"
+
+def get_inventory_page(db_path: str, limit: int, offset: int, search: Optional[str] = None,
+                       category: Optional[str] = None, domain: Optional[str] = None,
+                       location: Optional[str] = None) -> List[Dict[str, Union[int, str]]]:
+    """
+    按名称排序分页获取库存物品 (LIMIT/OFFSET)，筛选条件在 SQL 中执行。
+    每行附带 status_code 列 (库存状态码，由 SQL 计算)。
+    """
+    where, params = _inventory_filter_clause(search, category, domain, location)
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        cursor = conn.execute(
+            f"SELECT *, {SQL_STOCK_STATUS} AS status_code FROM inventory{where} ORDER BY name, id LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"数据库错误：分页获取库存失败：{e}")
+        return []
+
+def count_inventory(db_path: str, search: Optional[str] = None, category: Optional[str] = None,
+                    domain: Optional[str] = None, location: Optional[str] = None) -> int:
+    """统计满足筛选条件的库存物品数量"""
+    where, params = _inventory_filter_clause(search, category, domain, location)
+    try:
+        conn = get_conn(db_path)
+        return conn.execute(f"SELECT COUNT(*) FROM inventory{where}", params).fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"数据库错误：统计库存数量失败：{e}")
+        return 0
+
+def get_inventory_filter_options(db_path: str) -> Dict[str, List[str]]:
+    """获取库存表中出现过的类别、专业、储存位置 (去重排序)，用于筛选下拉框"""
+    values: Dict[str, set] = {'category': set(), 'domain': set(), 'location': set()}
+    try:
+        conn = get_conn(db_path)
+        cursor = conn.execute(
+            "SELECT 'category', category FROM inventory "
+            "UNION SELECT 'domain', domain FROM inventory "
+            "UNION SELECT 'location', location FROM inventory"
+        )
+        for column, value in cursor.fetchall():
+            value = (value or '').strip()
+            if value:
+                values[column].add(value)
+    except sqlite3.Error as e:
+        print(f"数据库错误：获取筛选选项失败：{e}")
+    return {column: sorted(options) for column, options in values.items()}
+
+def get_project_options(db_path: str) -> List[str]:
+    """获取交易记录中出现过的项目 (去重排序，排除空值和冲销记录)，用于筛选下拉框"""
+    projects = set()
+    try:
+        conn = get_conn(db_path)
+        cursor = conn.execute("SELECT DISTINCT project_ref FROM transactions")
+        for (project,) in cursor.fetchall():
+            project = (project or '').strip()
+            if project and not project.startswith('Reversed TX:'):
+                projects.add(project)
+    except sqlite3.Error as e:
+        print(f"数据库错误：获取项目选项失败：{e}")
+    return sorted(projects)
+
 def get_inventory_item_by_id(db_path: str, item_id: int) -> Optional[Dict]:
     """根据 ID 获取单个库存物品详情"""
-    conn = None
     try:
-        conn = _connect_db(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM inventory WHERE id=?", (item_id,))
         row = cursor.fetchone()
@@ -351,131 +760,172 @@ def get_inventory_item_by_id(db_path: str, item_id: int) -> Optional[Dict]:
     except sqlite3.Error as e:
         print(f"数据库错误：获取单个库存项失败：{e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def get_inventory_names(db_path: str) -> List[Dict[str, Union[int, str]]]:
-    """获取所有物品的 ID, Name, Reference, Unit, Current_Stock，用于对话框下拉列表"""
-    conn = None
+# 流式导出时每次从游标读取的行数
+_EXPORT_FETCH_SIZE = 1000
+
+_SQL_INVENTORY_EXPORT = """
+    SELECT name, reference, category, domain, unit, current_stock, min_stock, location
+    FROM inventory 
+    ORDER BY name
+"""
+
+_SQL_TRANSACTIONS_EXPORT = """
+    SELECT 
+        t.id, t.date, t.type, t.quantity, t.recipient_source, t.project_ref,
+        i.name AS item_name, i.reference AS item_reference, i.domain AS item_domain
+    FROM transactions t
+    JOIN inventory i ON t.item_id = i.id
+    ORDER BY t.date DESC
+"""
+
+def _iter_query(db_path: str, sql: str, error_text: str) -> Iterator[sqlite3.Row]:
+    """
+    按 _EXPORT_FETCH_SIZE 分批从游标读取并逐行产出，内存占用与结果总行数无关。
+    数据库错误会继续抛出，调用方据此区分“读取失败”与“没有数据”，避免导出被截断的文件。
+    """
     try:
-        conn = _connect_db(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, reference, unit, current_stock FROM inventory ORDER BY name")
-        return [dict(row) for row in cursor.fetchall()]
+        cursor = get_conn(db_path).execute(sql) # 长连接，不在此处关闭
+        while True:
+            rows = cursor.fetchmany(_EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
     except sqlite3.Error as e:
-        print(f"数据库错误：获取物品名称失败：{e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        print(f"数据库错误：{error_text}：{e}")
+        raise
+
+def iter_inventory_for_export(db_path: str) -> Iterator[sqlite3.Row]:
+    """逐行产出所有库存物品 (sqlite3.Row)，用于流式导出 CSV。"""
+    return _iter_query(db_path, _SQL_INVENTORY_EXPORT, "获取库存失败")
+
+def iter_transactions_for_export(db_path: str) -> Iterator[sqlite3.Row]:
+    """逐行产出所有交易记录 (含关联的物品信息，sqlite3.Row)，用于流式导出 CSV。"""
+    return _iter_query(db_path, _SQL_TRANSACTIONS_EXPORT, "获取交易历史失败")
 
 def get_inventory_for_export(db_path: str) -> List[Dict[str, Union[int, str]]]:
     """获取所有库存物品数据，用于导出 CSV。"""
-    conn = None
     try:
-        conn = _connect_db(db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT name, reference, category, domain, unit, current_stock, min_stock, location
-            FROM inventory 
-            ORDER BY name
-        """)
-        return [dict(row) for row in cursor.fetchall()]
-    except sqlite3.Error as e:
-        print(f"数据库错误：获取库存失败：{e}")
+        return [dict(row) for row in iter_inventory_for_export(db_path)]
+    except sqlite3.Error:
         return []
-    finally:
-        if conn:
-            conn.close()
 
 def get_transactions_for_export(db_path: str) -> List[Dict[str, Union[int, str]]]:
     """获取所有交易记录，包含关联的物品信息，用于导出 CSV。"""
-    conn = None
     try:
-        conn = _connect_db(db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                t.id, t.date, t.type, t.quantity, t.recipient_source, t.project_ref,
-                i.name AS item_name, i.reference AS item_reference, i.domain AS item_domain
-            FROM transactions t
-            JOIN inventory i ON t.item_id = i.id
-            ORDER BY t.date DESC
-        """)
-        return [dict(row) for row in cursor.fetchall()]
-    except sqlite3.Error as e:
-        print(f"数据库错误：获取交易历史失败：{e}")
+        return [dict(row) for row in iter_transactions_for_export(db_path)]
+    except sqlite3.Error:
         return []
-    finally:
-        if conn:
-            conn.close()
 
 # --- 用于批量导入的数据库方法 ---
 
+# SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER 为 999，IN 查询按此大小分块
+_IN_CHUNK_SIZE = 500
+
+def _executemany_or_per_row(cursor: sqlite3.Cursor, sql: str, rows: List[tuple]) -> int:
+    """
+    在 SAVEPOINT 中整批 executemany；若遇到约束冲突，回滚该批并逐行重试，
+    以便只跳过出错的行。返回失败行数 (未影响任何行的语句也计为失败，
+    例如批内重复 reference 的首行插入失败后，其后续 UPDATE 匹配不到记录)。
+    每条语句最多影响一行。
+    """
+    if not rows:
+        return 0
+    cursor.execute("SAVEPOINT batch_import")
+    try:
+        cursor.executemany(sql, rows)
+        affected = cursor.rowcount # 需在 RELEASE 之前读取
+        cursor.execute("RELEASE batch_import")
+        return len(rows) - affected
+    except sqlite3.IntegrityError:
+        cursor.execute("ROLLBACK TO batch_import")
+        cursor.execute("RELEASE batch_import")
+
+    failed = 0
+    for row in rows:
+        try:
+            cursor.execute(sql, row)
+            if cursor.rowcount == 0:
+                failed += 1
+        except sqlite3.IntegrityError:
+            failed += 1
+    return failed
+
+
 def batch_import_inventory(db_path: str, items: List[Dict]) -> Dict[str, int]:
     """
     批量导入或更新库存物品。使用 'reference' 作为唯一键。
     如果 'reference' 存在，则更新名称、类别、专业、单位、最小库存、位置。
     如果 'reference' 不存在，则插入新记录 (current_stock 设为 0)。
-    返回包含操作统计的字典。
+    先用分块 IN 查询一次性判断哪些 reference 已存在，再分别 executemany 插入和更新。
+    在同一个写事务中完成。返回包含操作统计的字典。
     """
-    conn = None
-    stats = {'inserted': 0, 'updated': 0, 'failed': 0}
-    
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # SQL for UPDATE
-        update_sql = """
-            UPDATE inventory 
-            SET name=?, category=?, domain=?, unit=?, min_stock=?, location=?
-            WHERE reference=?
-        """
-        # SQL for INSERT
-        insert_sql = """
-            INSERT INTO inventory (name, reference, category, domain, unit, current_stock, min_stock, location) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        
-        for item in items:
-            try:
-                item_category = item.get('category', '其他')
-                item_domain = item.get('domain', '其他')
-                
-                # 1. 尝试更新
-                cursor.execute(
-                    update_sql, 
-                    (item['name'], item_category, item_domain, item['unit'], item['min_stock'], item['location'], item['reference'])
-                )
-                
-                if cursor.rowcount > 0:
-                    stats['updated'] += 1
-                else:
-                    # 2. 如果没有更新任何行，则插入新行 
-                    initial_stock = item.get('current_stock', 0) 
-                    
-                    cursor.execute(
-                        insert_sql, 
-                        (item['name'], item['reference'], item_category, item_domain, item['unit'], initial_stock, item['min_stock'], item['location'])
-                    )
-                    stats['inserted'] += 1
-
-            except sqlite3.IntegrityError:
-                stats['failed'] += 1
-            except Exception:
-                stats['failed'] += 1
-        
-        conn.commit()
+        return _run_write(db_path, _batch_import_inventory_job, items)
     except sqlite3.Error as e:
-        conn.rollback()
-        stats['failed'] = len(items) - stats['inserted'] - stats['updated']
         print(f"数据库批量导入错误: {e}")
-    finally:
-        if conn:
-            conn.close()
+        return {'inserted': 0, 'updated': 0, 'failed': len(items)}
+
+
+def _batch_import_inventory_job(conn: sqlite3.Connection, items: List[Dict]) -> Dict[str, int]:
+    """batch_import_inventory 的写任务，由 _run_write 在事务中执行。"""
+    stats = {'inserted': 0, 'updated': 0, 'failed': 0}
+    cursor = conn.cursor()
+
+    # SQL for UPDATE
+    update_sql = """
+        UPDATE inventory 
+        SET name=?, category=?, domain=?, unit=?, min_stock=?, location=?
+        WHERE reference=?
+    """
+    # SQL for INSERT
+    insert_sql = """
+        INSERT INTO inventory (name, reference, category, domain, unit, current_stock, min_stock, location) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    # 1. 一次性查询已存在的 reference (分块以避开参数个数上限)
+    refs = list({item.get('reference') for item in items if item.get('reference') is not None})
+    existing = set()
+    for i in range(0, len(refs), _IN_CHUNK_SIZE):
+        chunk = refs[i:i + _IN_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"SELECT reference FROM inventory WHERE reference IN ({placeholders})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    
+    # 2. 单次遍历，将物品分为插入组和更新组
+    insert_rows = []
+    update_rows = []
+    for item in items:
+        try:
+            item_category = item.get('category', '其他')
+            item_domain = item.get('domain', '其他')
+            reference = item['reference']
             
+            if reference in existing:
+                update_rows.append(
+                    (item['name'], item_category, item_domain, item['unit'], item['min_stock'], item['location'], reference)
+                )
+            else:
+                initial_stock = item.get('current_stock', 0) 
+                insert_rows.append(
+                    (item['name'], reference, item_category, item_domain, item['unit'], initial_stock, item['min_stock'], item['location'])
+                )
+                # 同一批次中重复出现的 reference，后续行按更新处理
+                if reference is not None:
+                    existing.add(reference)
+        except Exception:
+            stats['failed'] += 1
+    
+    # 3. 两次 executemany 完成写入 (先插入，保证批内重复行的更新能命中)
+    failed = _executemany_or_per_row(cursor, insert_sql, insert_rows)
+    stats['inserted'] += len(insert_rows) - failed
+    stats['failed'] += failed
+    
+    failed = _executemany_or_per_row(cursor, update_sql, update_rows)
+    stats['updated'] += len(update_rows) - failed
+    stats['failed'] += failed
+    
     return stats
 
 
@@ -485,40 +935,39 @@ def record_transaction(db_path: str, item_id: int, date: str, type: str, quantit
     """
     记录交易并原子性地更新库存 (单笔)。
     """
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 1. 检查库存 (仅限 OUT 类型)
-        if type == 'OUT':
-            cursor.execute("SELECT current_stock FROM inventory WHERE id = ?", (item_id,))
-            current_stock = cursor.fetchone()
-            if current_stock is None or current_stock[0] < quantity:
-                return False # 库存不足
-        
-        # 2. 更新库存
-        stock_change = quantity if type == 'IN' else -quantity
-        cursor.execute("""
-            UPDATE inventory SET current_stock = current_stock + ? WHERE id = ?
-        """, (stock_change, item_id))
-
-        # 3. 记录交易
-        cursor.execute("""
-            INSERT INTO transactions (item_id, date, type, quantity, recipient_source, project_ref)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (item_id, date, type, quantity, recipient_source, project_ref))
-        
-        conn.commit()
-        return True
+        return _run_write(
+            db_path, _record_transaction_job, item_id, date, type, quantity, recipient_source, project_ref
+        )
     except sqlite3.Error as e:
         print(f"数据库错误：交易记录失败：{e}")
-        if conn:
-            conn.rollback() 
         return False
-    finally:
-        if conn:
-            conn.close()
+
+
+def _record_transaction_job(conn: sqlite3.Connection, item_id: int, date: str, type: str, quantity: int, recipient_source: str, project_ref: str) -> bool:
+    """record_transaction 的写任务，由 _run_write 在事务中执行。"""
+    cursor = conn.cursor()
+    
+    # 1. 检查库存 (仅限 OUT 类型)
+    if type == 'OUT':
+        cursor.execute("SELECT current_stock FROM inventory WHERE id = ?", (item_id,))
+        current_stock = cursor.fetchone()
+        if current_stock is None or current_stock[0] < quantity:
+            return False # 库存不足
+    
+    # 2. 更新库存
+    stock_change = quantity if type == 'IN' else -quantity
+    cursor.execute("""
+        UPDATE inventory SET current_stock = current_stock + ? WHERE id = ?
+    """, (stock_change, item_id))
+
+    # 3. 记录交易
+    cursor.execute("""
+        INSERT INTO transactions (item_id, date, type, quantity, recipient_source, project_ref)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (item_id, date, type, quantity, recipient_source, project_ref))
+    
+    return True
 
 
 def batch_record_transactions(
@@ -529,6 +978,7 @@ def batch_record_transactions(
 ) -> Dict[str, Union[int, List[Dict]]]:
     """
     🚀 【新增功能】批量记录出库 (OUT) 或入库 (IN) 交易。
+    所有交易在同一个写事务中完成。
     
     :param db_path: 数据库路径
     :param transaction_type: 交易类型 ('IN' 或 'OUT')
@@ -537,10 +987,7 @@ def batch_record_transactions(
                          {'item_id': int, 'quantity': int, 'project_ref': str}
     :return: 包含成功/失败计数的字典，失败的交易列表会回滚。
     """
-    conn = None
     type_upper = transaction_type.upper()
-    current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
     results = {'successful_count': 0, 'failed_transactions': []}
     
     if type_upper not in ['IN', 'OUT']:
@@ -548,102 +995,85 @@ def batch_record_transactions(
         return results
 
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 提前获取所有物品的当前库存，减少数据库查询次数
-        cursor.execute("SELECT id, current_stock FROM inventory")
-        inventory_stocks = {row[0]: row[1] for row in cursor.fetchall()}
+        return _run_write(
+            db_path, _batch_record_transactions_job, type_upper, recipient_source, transactions, results
+        )
+    except sqlite3.Error as e:
+        # 数据库错误，写任务已整体回滚
+        print(f"数据库批量交易失败：{e}")
+        # 将所有未处理的交易视为失败
+        results['failed_transactions'] = transactions
+        results['successful_count'] = 0
+        return results
+
+
+def _batch_record_transactions_job(
+    conn: sqlite3.Connection,
+    type_upper: str,
+    recipient_source: str,
+    transactions: List[Dict[str, Union[int, str]]],
+    results: Dict[str, Union[int, List[Dict]]]
+) -> Dict[str, Union[int, List[Dict]]]:
+    """batch_record_transactions 的写任务，由 _run_write 在事务中执行。"""
+    current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.cursor()
+    
+    # 提前获取所有物品的当前库存，减少数据库查询次数
+    cursor.execute("SELECT id, current_stock FROM inventory")
+    inventory_stocks = {row[0]: row[1] for row in cursor.fetchall()}
+    
+    # 检查是否可以执行所有交易
+    for tx in transactions:
+        item_id = tx['item_id']
+        quantity = tx['quantity']
         
-        # 检查是否可以执行所有交易
-        for tx in transactions:
-            item_id = tx['item_id']
-            quantity = tx['quantity']
+        if item_id not in inventory_stocks:
+            # 物品不存在，标记失败 (写连接开启了外键约束，不能再写入该交易)
+            tx['error'] = '物品不存在'
+            results['failed_transactions'].append(tx)
+            continue
             
-            if item_id not in inventory_stocks:
-                # 物品不存在，标记失败
+        if type_upper == 'OUT':
+            current_stock = inventory_stocks[item_id]
+            if current_stock < quantity:
+                # 库存不足，标记失败，并中断整个批次提交 (回滚本任务，返回已包含不足交易的结果)
+                tx['error'] = '库存不足'
                 results['failed_transactions'].append(tx)
-                continue
-                
-            if type_upper == 'OUT':
-                current_stock = inventory_stocks[item_id]
-                if current_stock < quantity:
-                    # 库存不足，标记失败，并中断整个批次提交
-                    tx['error'] = '库存不足'
-                    results['failed_transactions'].append(tx)
-                    raise ValueError("库存不足，批量交易中断") 
-                
-                # 预先扣除库存（内存中）
-                inventory_stocks[item_id] -= quantity
-            elif type_upper == 'IN':
-                 # 预先增加库存（内存中）
-                 inventory_stocks[item_id] += quantity
-
-
-        # 1. 批量更新 Inventory 表
-        update_inventory_batch = []
-        for item_id, new_stock in inventory_stocks.items():
-            # 仅更新涉及本次交易的物品，避免无意义的 UPDATE
-            # 简化逻辑：我们已经知道哪些物品被修改了，但为了安全和简洁，直接对所有物品更新，或者仅对交易列表中的物品更新。
-            # 这里选择只更新在 transactions 列表中的物品 (如果它们成功通过检查)
-            pass
-
-        # 针对每笔交易执行数据库操作
-        for tx in transactions:
-            item_id = tx['item_id']
-            quantity = tx['quantity']
-            project_ref = tx['project_ref']
+                raise _RollbackWith(results)
             
-            # 确保只处理通过预检的交易 (虽然 ValueError 会中断，但还是保持防御性)
-            if 'error' in tx:
-                continue
+            # 预先扣除库存（内存中）
+            inventory_stocks[item_id] -= quantity
+        elif type_upper == 'IN':
+             # 预先增加库存（内存中）
+             inventory_stocks[item_id] += quantity
 
-            stock_change = quantity if type_upper == 'IN' else -quantity
-            
-            # 1. 更新库存
-            cursor.execute("""
-                UPDATE inventory SET current_stock = current_stock + ? WHERE id = ?
-            """, (stock_change, item_id))
-
-            # 2. 记录交易
-            cursor.execute("""
-                INSERT INTO transactions (item_id, date, type, quantity, recipient_source, project_ref)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (item_id, current_datetime, type_upper, quantity, recipient_source, project_ref))
-            
-            results['successful_count'] += 1
+    # 针对每笔交易执行数据库操作
+    for tx in transactions:
+        item_id = tx['item_id']
+        quantity = tx['quantity']
+        project_ref = tx['project_ref']
+        
+        # 确保只处理通过预检的交易
+        if 'error' in tx:
+            continue
 
-        # 3. 提交所有成功的交易
-        conn.commit()
-        return results
+        stock_change = quantity if type_upper == 'IN' else -quantity
         
-    except ValueError as e:
-        # 库存不足导致的预检失败，回滚所有操作
-        conn.rollback()
-        # 确保库存不足的错误信息被返回
-        if "库存不足" in str(e):
-             # results['failed_transactions'] 已经包含不足的交易
-            return results
-        else:
-            # 其他值错误，将所有未处理的交易视为失败
-             all_transactions = transactions 
-             results['failed_transactions'] = all_transactions
-             results['successful_count'] = 0
-             return results
-             
-    except sqlite3.Error as e:
-        # 数据库错误，回滚所有操作
-        conn.rollback()
-        print(f"数据库批量交易失败：{e}")
-        # 将所有未处理的交易视为失败
-        all_transactions = transactions 
-        results['failed_transactions'] = all_transactions
-        results['successful_count'] = 0
-        return results
+        # 1. 更新库存
+        cursor.execute("""
+            UPDATE inventory SET current_stock = current_stock + ? WHERE id = ?
+        """, (stock_change, item_id))
+
+        # 2. 记录交易
+        cursor.execute("""
+            INSERT INTO transactions (item_id, date, type, quantity, recipient_source, project_ref)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (item_id, current_datetime, type_upper, quantity, recipient_source, project_ref))
         
-    finally:
-        if conn:
-            conn.close()
+        results['successful_count'] += 1
+
+    # 所有成功的交易由 _run_write 一并提交
+    return results
 
 
 def get_transactions_history(
@@ -660,9 +1090,8 @@ def get_transactions_history(
     """
     获取交易记录，支持按日期范围、交易类型、物品名称/编号、类别、专业、地点和项目进行筛选。
     """
-    conn = None
     try:
-        conn = _connect_db(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         
         query = """
@@ -678,14 +1107,16 @@ def get_transactions_history(
         """
         params = []
         
-        # 1. 日期筛选
+        # 1. 日期筛选：date 以 ISO 格式存储，直接按字符串比较，可走 idx_transactions_date 范围扫描
         if start_date:
-            query += " AND DATE(t.date) >= ?"
+            query += " AND t.date >= ?"
             params.append(start_date)
             
         if end_date:
-            query += " AND DATE(t.date) <= ?"
-            params.append(end_date)
+            # 结束日期包含当天：取次日零点作为开区间上界
+            next_day = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            query += " AND t.date < ?"
+            params.append(next_day)
             
         # 2. 交易类型筛选
         if tx_type and tx_type.upper() != 'ALL':
@@ -726,9 +1157,6 @@ def get_transactions_history(
     except sqlite3.Error as e:
         print(f"数据库错误：获取交易历史失败：{e}")
         return []
-    finally:
-        if conn:
-            conn.close()
             
             
 def reverse_transaction(db_path: str, tx_id: int) -> bool:
@@ -872,7 +1300,7 @@ def get_transaction_by_id(db_path: str, tx_id: int) -> Optional[Dict[str, Union[
     """
     conn = None
     try:
-        conn = _connect_db(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
         
         query = """
@@ -897,11 +1325,68 @@ def get_transaction_by_id(db_path: str, tx_id: int) -> Optional[Dict[str, Union[
     except sqlite3.Error as e:
         print(f"数据库错误：获取交易记录失败：{e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 
+def get_transaction_edit_bundle(db_path: str, tx_id: int) -> Tuple[Optional[Dict[str, Union[int, str]]], List[str]]:
+    """
+    修改交易对话框所需数据：在同一个连接中读取交易记录和 PROJECT 配置选项。
+    只有出库 (OUT) 记录需要项目选项，其他类型返回空列表。
+    返回 (交易记录字典或 None, 项目选项列表)。
+    """
+    conn = None
+    try:
+        conn = get_conn(db_path) # 长连接，不在此处关闭
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 
+                t.id, t.date, t.type, t.quantity, t.recipient_source, t.project_ref, t.item_id,
+                i.name AS item_name, i.reference AS item_ref, 
+                i.location AS location,
+                i.category AS category,
+                i.domain AS domain
+            FROM transactions t
+            JOIN inventory i ON t.item_id = i.id
+            WHERE t.id = ?
+        """, (tx_id,))
+        row = cursor.fetchone()
+        transaction = dict(row) if row else None
+        if transaction is None or transaction['type'] != 'OUT':
+            return transaction, []
+        
+        # 项目选项优先取缓存，未命中时用同一游标查询并写入缓存
+        cached = _OPTIONS_CACHE.get((db_path, 'PROJECT'))
+        if cached is not None and time.monotonic() - cached[0] < _OPTIONS_CACHE_TTL:
+            projects = list(cached[1])
+        else:
+            cursor.execute("SELECT value FROM config WHERE category = 'PROJECT' ORDER BY value")
+            projects = [r[0] for r in cursor.fetchall()]
+            _OPTIONS_CACHE[(db_path, 'PROJECT')] = (time.monotonic(), list(projects))
+        
+        return transaction, projects
+    except sqlite3.Error as e:
+        print(f"数据库错误：获取交易记录失败：{e}")
+        return None, []
+
+
+# 修改交易记录时使用的语句 (模块常量，长连接的语句缓存可直接复用)
+SQL_SELECT_TX_FOR_UPDATE = "SELECT item_id, type, quantity FROM transactions WHERE id = ?"
+# 按交易 ID 定位物品并调整库存；变化量为负时要求调整后库存不小于 0，否则不更新任何行
+SQL_ADJUST_STOCK_FOR_TX = """
+    UPDATE inventory 
+    SET current_stock = current_stock + ? 
+    WHERE id = (SELECT item_id FROM transactions WHERE id = ?)
+      AND (? >= 0 OR current_stock + ? >= 0)
+"""
+SQL_UPDATE_TX = """
+    UPDATE transactions 
+    SET quantity = ?, 
+        date = ?, 
+        recipient_source = ?, 
+        project_ref = ?
+    WHERE id = ?
+"""
+
 def update_transaction(
     db_path: str,
     tx_id: int,
@@ -911,24 +1396,28 @@ def update_transaction(
     project_ref: str = ""
 ) -> bool:
     """
-    更新交易记录并自动调整库存
+    更新交易记录并自动调整库存。
+    读取、库存调整和交易更新在同一个 BEGIN IMMEDIATE 事务中完成，只提交一次。
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn(db_path) # 长连接，不在此处关闭
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
         
         # 1. 获取原始交易详情
-        cursor.execute("SELECT item_id, type, quantity FROM transactions WHERE id = ?", (tx_id,))
+        cursor.execute(SQL_SELECT_TX_FOR_UPDATE, (tx_id,))
         tx_record = cursor.fetchone()
         
         if not tx_record:
+            conn.rollback()
             return False
         
         item_id, tx_type, original_quantity = tx_record
         
         if tx_type.startswith('REVERSAL'): 
             # print(f"错误：不能修改冲销记录 (ID: {tx_id})。")
+            conn.rollback()
             return False
             
         # 2. 计算库存变化量 (总变化量 = 撤销原交易影响 + 应用新交易影响)
@@ -941,32 +1430,17 @@ def update_transaction(
         
         total_stock_change = undo_change + apply_change
         
-        # 3. 检查修改后库存是否足够 (仅在总变化为负时检查)
-        if total_stock_change < 0:
-            cursor.execute("SELECT current_stock FROM inventory WHERE id = ?", (item_id,))
-            current_stock_result = cursor.fetchone()
-            if not current_stock_result or current_stock_result[0] + total_stock_change < 0:
-                # print(f"错误：修改此交易会导致库存不足")
-                return False
-        
-        # 4. 更新库存
-        cursor.execute("""
-            UPDATE inventory 
-            SET current_stock = current_stock + ? 
-            WHERE id = ?
-        """, (total_stock_change, item_id))
+        # 3. 更新库存 (库存检查合并在同一条 UPDATE 中，未更新任何行即为库存不足)
+        cursor.execute(SQL_ADJUST_STOCK_FOR_TX, (total_stock_change, tx_id, total_stock_change, total_stock_change))
+        if cursor.rowcount == 0:
+            # print(f"错误：修改此交易会导致库存不足")
+            conn.rollback()
+            return False
         
-        # 5. 更新交易记录
-        cursor.execute("""
-            UPDATE transactions 
-            SET quantity = ?, 
-                date = ?, 
-                recipient_source = ?, 
-                project_ref = ?
-            WHERE id = ?
-        """, (quantity, date, recipient_source, project_ref, tx_id))
+        # 4. 更新交易记录
+        cursor.execute(SQL_UPDATE_TX, (quantity, date, recipient_source, project_ref, tx_id))
         
-        # 6. 提交事务
+        # 5. 提交事务
         conn.commit()
         return True
         
@@ -975,6 +1449,3 @@ def update_transaction(
         if conn:
             conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
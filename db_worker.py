@@ -0,0 +1,47 @@
+# db_worker.py
+# 在全局线程池中执行数据库操作，避免提交 (fsync) 时阻塞 UI 线程。
+# 结果通过信号排队回到 UI 线程处理。
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+import db_manager
+
+
+class DbTaskSignals(QObject):
+    """DbTask 的信号载体 (QRunnable 不是 QObject，不能直接定义信号)。"""
+    finished = pyqtSignal(object) # 任务返回值
+    failed = pyqtSignal(str)      # 异常信息
+
+
+class DbTask(QRunnable):
+    """在线程池中调用 func(*args, **kwargs)，完成后发出 finished 或 failed 信号。"""
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = DbTaskSignals()
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        finally:
+            # 池线程空闲 30 秒后退出并被替换，不在池线程上保留长连接
+            db_manager.release_thread_connections()
+        self.signals.finished.emit(result)
+
+
+def run_in_background(func, *args, on_finished=None, on_failed=None, **kwargs) -> DbTask:
+    """
+    提交数据库任务到 QThreadPool.globalInstance()。
+    调用方需持有返回的 DbTask 引用，直到回调执行完毕。
+    """
+    task = DbTask(func, *args, **kwargs)
+    if on_finished is not None:
+        task.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        task.signals.failed.connect(on_failed)
+    QThreadPool.globalInstance().start(task)
+    return task
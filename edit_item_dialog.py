@@ -1,6 +1,7 @@
 # edit_item_dialog.py
+from __future__ import annotations # 注解不在运行时求值，typing 仅供静态检查使用
 import sys
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING
 from PyQt6.QtWidgets import (
     QDialog, QDialogButtonBox, QVBoxLayout, QGridLayout, 
     QLabel, QLineEdit, QSpinBox, QMessageBox, QApplication, 
@@ -10,6 +11,17 @@ from PyQt6.QtCore import Qt
 
 # 导入数据库管理器
 import db_manager 
+from db_worker import run_in_background
+
+if TYPE_CHECKING:
+    from typing import Dict, Any, List
+
+ALIGN_LEFT = Qt.AlignmentFlag.AlignLeft
+
+def add_row(form: QGridLayout, row: int, text: str, widget: QWidget):
+    """在表单的第 row 行添加 “标签 + 控件”。"""
+    form.addWidget(QLabel(text), row, 0, ALIGN_LEFT)
+    form.addWidget(widget, row, 1)
 
 class EditItemDialog(QDialog):
     """
@@ -21,6 +33,10 @@ class EditItemDialog(QDialog):
         self.db_path = db_path
         self.item_id = item_data['id']
         self.original_data = item_data
+        self.updated_row = None # 保存成功后的物品数据，供库存页面局部刷新
+        self._save_task = None # 进行中的后台保存任务
+        self._saving_data: Dict[str, Any] = {} # 正在后台保存的表单数据
+        self._ok_text = "" # 保存期间替换前的 OK 按钮文字 (随平台/翻译而异)
         
         self.init_ui()
         self.load_data() # 加载数据到所有控件
@@ -49,76 +65,108 @@ class EditItemDialog(QDialog):
             QMessageBox.critical(self, "加载错误", f"无法加载 {category} 选项: {e}", QMessageBox.StandardButton.Ok)
             return []
 
+    def load_config_options_bulk(self, categories: List[str]) -> Dict[str, List[str]]:
+        """一次查询获取多个类别的配置选项"""
+        try:
+            return db_manager.get_config_options_bulk(self.db_path, categories)
+        except AttributeError:
+            # db_manager 缺少批量接口时，逐个类别加载
+            return {category: self.load_config_options(category) for category in categories}
+        except Exception as e:
+            QMessageBox.critical(self, "加载错误", f"无法加载配置选项: {e}", QMessageBox.StandardButton.Ok)
+            return {category: [] for category in categories}
+
+    # --- 控件工厂：按输入类型构建控件，签名 (self, key, options) ---
+    # 每个工厂同时登记该字段的取值函数 (_getters) 和赋值函数 (_setters)，
+    # load_data / accept_action 直接调用，无需再按控件类型 isinstance 分派。
+    def _make_line_edit(self, key: str, options: List[str]) -> QLineEdit:
+        entry = QLineEdit()
+        # 名称和编号必填，连接校验函数
+        if key in ['name', 'reference']:
+            entry.textChanged.connect(self.validate_inputs)
+        self._getters[key] = lambda: entry.text().strip()
+        self._setters[key] = lambda value: entry.setText(str(value))
+        return entry
+
+    def _make_spin(self, key: str, options: List[str]) -> QSpinBox:
+        entry = QSpinBox()
+        entry.setRange(0, 999999)
+
+        def set_value(value):
+            # QSpinBox 期望 int 或可以转换为 int 的值
+            try:
+                entry.setValue(int(value))
+            except (ValueError, TypeError):
+                entry.setValue(0)
+
+        self._getters[key] = entry.value
+        self._setters[key] = set_value
+        return entry
+
+    def _make_combo(self, key: str, options: List[str]) -> QComboBox:
+        entry = QComboBox()
+        entry.addItems(options)
+        # 文本 -> 下标映射，以 O(1) 查找代替 findText 线性扫描
+        index_map = {text: i for i, text in enumerate(options)}
+
+        def set_value(value):
+            index = index_map.get(str(value), -1)
+            if index != -1:
+                entry.setCurrentIndex(index)
+            else:
+                # 如果原值不在列表中，尝试设置为该文本（可能在后面添加）
+                entry.setCurrentText(str(value))
+
+        self._getters[key] = entry.currentText
+        self._setters[key] = set_value
+        return entry
+
+    WIDGET_FACTORIES = {
+        'text': _make_line_edit,
+        'spin': _make_spin,
+        'combo': _make_combo,
+    }
+
     def init_ui(self):
         main_layout = QVBoxLayout(self)
         form_layout = QGridLayout()
         
         # --- 1. 定义输入字段 ---
         
-        # 字段配置: (标签文本, 键名, 输入类型)
+        # 字段配置: (标签文本, 键名, 输入类型, 配置类别)，下拉框的选项来自 config 表的对应类别
         fields = [
-            ("物品名称 (Name):", 'name', 'text'),
-            ("物品型号 (Ref):", 'reference', 'text'),
-            ("材料类别 (Category):", 'category', 'combo_category'), 
-            # **** 新增专业 (Domain) 下拉框 ****
-            ("专业 (Domain):", 'domain', 'combo_domain'), 
-            ("计量单位 (Unit):", 'unit', 'combo_unit'), 
-            ("最小库存 (Min Stock):", 'min_stock', 'spin'),
-            ("存放位置 (Location):", 'location', 'combo_location') 
+            ("物品名称 (Name):", 'name', 'text', None),
+            ("物品型号 (Ref):", 'reference', 'text', None),
+            ("材料类别 (Category):", 'category', 'combo', 'CATEGORY'), 
+            ("专业 (Domain):", 'domain', 'combo', 'DOMAIN'), 
+            ("计量单位 (Unit):", 'unit', 'combo', 'UNIT'), 
+            ("最小库存 (Min Stock):", 'min_stock', 'spin', None),
+            ("存放位置 (Location):", 'location', 'combo', 'LOCATION') 
         ]
 
         self.entries = {}
+        self._getters = {}
+        self._setters = {}
         row = 0
         
+        # 所有下拉框的选项一次性读取
+        options_by_cat = self.load_config_options_bulk(
+            [category for _, _, kind, category in fields if kind == 'combo']
+        )
+        
         # 显示 ID 和当前库存作为参考，但不允许编辑
-        form_layout.addWidget(QLabel("ID:"), row, 0, Qt.AlignmentFlag.AlignLeft)
-        form_layout.addWidget(QLabel(str(self.item_id)), row, 1)
+        add_row(form_layout, row, "ID:", QLabel(str(self.item_id)))
         row += 1
         
-        form_layout.addWidget(QLabel("当前库存:"), row, 0, Qt.AlignmentFlag.AlignLeft)
-        form_layout.addWidget(QLabel(str(self.original_data.get('current_stock', 0))), row, 1)
+        add_row(form_layout, row, "当前库存:", QLabel(str(self.original_data.get('current_stock', 0))))
         row += 1
         
         
-        for label_text, key, input_type in fields:
-            label = QLabel(label_text)
-            
-            if input_type == 'text':
-                entry = QLineEdit()
-                # 名称和编号必填，连接校验函数
-                if key in ['name', 'reference']:
-                    entry.textChanged.connect(self.validate_inputs) 
-            elif input_type == 'spin':
-                entry = QSpinBox()
-                entry.setRange(0, 999999) 
-            
-            # --- QComboBox 逻辑 ---
-            elif input_type == 'combo_category':
-                entry = QComboBox()
-                # 动态加载材料类别选项
-                category_options = self.load_config_options('CATEGORY')
-                entry.addItems(category_options)
-            elif input_type == 'combo_domain':
-                entry = QComboBox()
-                # 动态加载专业选项 (新增逻辑)
-                domain_options = self.load_config_options('DOMAIN')
-                entry.addItems(domain_options)
-            elif input_type == 'combo_unit':
-                entry = QComboBox()
-                # 动态加载计量单位选项
-                unit_options = self.load_config_options('UNIT')
-                entry.addItems(unit_options)
-            elif input_type == 'combo_location':
-                entry = QComboBox()
-                # 动态加载存放位置选项
-                location_options = self.load_config_options('LOCATION')
-                entry.addItems(location_options)
-            
-            
+        for label_text, key, kind, category in fields:
+            entry = self.WIDGET_FACTORIES[kind](self, key, options_by_cat.get(category, []))
             self.entries[key] = entry
             
-            form_layout.addWidget(label, row, 0, Qt.AlignmentFlag.AlignLeft)
-            form_layout.addWidget(entry, row, 1)
+            add_row(form_layout, row, label_text, entry)
             row += 1
 
         main_layout.addLayout(form_layout)
@@ -129,6 +177,9 @@ class EditItemDialog(QDialog):
         )
         self.buttonBox.accepted.connect(self.accept_action)
         self.buttonBox.rejected.connect(self.reject)
+        # 缓存 OK 按钮，validate_inputs 每次按键都会用到
+        self._ok_button = self.buttonBox.button(QDialogButtonBox.StandardButton.Ok)
+        self._last_enabled = None
         
         main_layout.addWidget(self.buttonBox)
         
@@ -136,74 +187,88 @@ class EditItemDialog(QDialog):
 
     def load_data(self):
         """将原始数据填充到输入框"""
-        for key, entry in self.entries.items():
-            value = self.original_data.get(key, '')
-            if isinstance(entry, QLineEdit):
-                entry.setText(str(value))
-            elif isinstance(entry, QSpinBox):
-                # QSpinBox 期望 int 或可以转换为 int 的值
-                try:
-                    entry.setValue(int(value))
-                except (ValueError, TypeError):
-                    entry.setValue(0)
-            elif isinstance(entry, QComboBox):
-                # 对于 QComboBox，找到匹配的文本并设置当前选中项
-                index = entry.findText(str(value))
-                if index != -1:
-                    entry.setCurrentIndex(index)
-                else:
-                    # 如果原值不在列表中，尝试设置为该文本（可能在后面添加）
-                    entry.setCurrentText(str(value))
-
-
-    def validate_inputs(self):
-        """检查必填字段是否已填写，并启用/禁用 OK 按钮"""
+        for key, setter in self._setters.items():
+            setter(self.original_data.get(key, ''))
+
+
+    def validate_inputs(self, *_):
+        """检查必填字段是否已填写，并启用/禁用 OK 按钮 (*_ 吸收 textChanged 携带的文本参数)"""
         # 只有 name 和 reference 字段是 QLineEdit 且必填
-        name_ok = bool(self.entries['name'].text().strip())
-        ref_ok = bool(self.entries['reference'].text().strip())
+        enabled = bool(self.entries['name'].text().strip() and self.entries['reference'].text().strip())
         
-        self.buttonBox.button(QDialogButtonBox.StandardButton.Ok).setEnabled(name_ok and ref_ok)
+        # 状态未变化时不调用 setEnabled
+        if enabled != self._last_enabled:
+            self._last_enabled = enabled
+            self._ok_button.setEnabled(enabled)
         
         
-    def accept_action(self):
+    def accept_action(self, *_):
         """当用户点击 OK 按钮时执行的操作：更新数据库。"""
         
         # 收集数据
-        data: Dict[str, Any] = {}
-        for key, entry in self.entries.items():
-            if isinstance(entry, QLineEdit):
-                data[key] = entry.text().strip()
-            elif isinstance(entry, QSpinBox):
-                data[key] = entry.value()
-            elif isinstance(entry, QComboBox):
-                # 从 QComboBox 获取当前选中的文本
-                data[key] = entry.currentText()
-        
-        # 调用数据库管理器进行更新操作 
-        try:
-            success = db_manager.update_inventory_item(
-                db_path=self.db_path,
-                item_id=self.item_id,
-                name=data['name'],
-                reference=data['reference'],
-                category=data['category'],
-                domain=data['domain'], # **** 传递新增的 domain 字段 ****
-                unit=data['unit'],
-                min_stock=data['min_stock'],
-                location=data['location']
-            )
-        except TypeError as e:
-            QMessageBox.critical(self, "数据库管理器错误", 
-                                 f"更新物品失败！错误：{e}\n请确保 db_manager.py 中的 update_inventory_item 函数已更新以接受 'category' 和 'domain' 参数。")
+        data: Dict[str, Any] = {key: getter() for key, getter in self._getters.items()}
+        
+        # 只保留与原始数据不同的字段
+        changed = {}
+        for key, value in data.items():
+            original = self.original_data.get(key)
+            if str(value) != str(original if original is not None else ''):
+                changed[key] = value
+        
+        if not changed:
+            # 没有修改时不写数据库，直接关闭
+            QMessageBox.information(self, "提示", "没有任何修改。")
+            super().accept()
             return
         
+        # 调用数据库管理器，仅更新变化的列。写入在后台线程执行，期间禁用按钮
+        self._saving_data = data
+        self.buttonBox.setEnabled(False)
+        self._ok_text = self._ok_button.text()
+        self._ok_button.setText("保存中...")
+        self._save_task = run_in_background(
+            db_manager.update_inventory_item_partial, self.db_path, self.item_id,
+            on_finished=self._on_save_finished,
+            on_failed=self._on_save_failed,
+            **changed
+        )
+
+    def _on_save_finished(self, success: bool):
+        """后台更新完成 (UI 线程)。"""
+        self._save_task = None
+        data = self._saving_data
         if success:
+            self.updated_row = {**self.original_data, **data}
             QMessageBox.information(self, "成功", f"物品 '{data['name']}' (ID: {self.item_id}) 更新成功！")
             super().accept() # 关闭对话框
         else:
             # 失败通常是由于 reference 编号重复或 ID 不存在
+            self._restore_buttons()
             QMessageBox.critical(self, "操作失败", f"更新物品失败！物品编号 '{data['reference']}' 可能已存在或未修改任何数据。")
+
+    def _on_save_failed(self, error: str):
+        """后台更新抛出异常 (UI 线程)。"""
+        self._save_task = None
+        self._restore_buttons()
+        QMessageBox.critical(self, "数据库管理器错误", 
+                             f"更新物品失败！错误：{error}\n请确保 db_manager.py 中存在 update_inventory_item_partial 函数。")
+
+    def _restore_buttons(self):
+        self._ok_button.setText(self._ok_text)
+        self.buttonBox.setEnabled(True)
+
+    def reject(self):
+        # 后台保存进行中时忽略 Esc / 取消，否则写入已提交而调用方却收到 Rejected
+        if self._save_task is not None:
             return
+        super().reject()
+
+    def closeEvent(self, event):
+        # 后台保存进行中时忽略窗口关闭按钮
+        if self._save_task is not None:
+            event.ignore()
+            return
+        super().closeEvent(event)
             
 # --- 测试代码 ---
 if __name__ == '__main__':
@@ -228,6 +293,11 @@ if __name__ == '__main__':
             print(f"ID: {kwargs.get('item_id')}, Name: {kwargs.get('name')}, Category: {kwargs.get('category')}, Domain: {kwargs.get('domain')}, Unit: {kwargs.get('unit')}, Location: {kwargs.get('location')}")
             return True
             
+        @staticmethod
+        def update_inventory_item_partial(db_path, item_id, **changes):
+            print(f"--- Mock DB Partial Update Called --- ID: {item_id}, Changes: {changes}")
+            return True
+            
     db_manager = MockDBManager()
 
     app = QApplication(sys.argv)
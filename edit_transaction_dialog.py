@@ -1,15 +1,35 @@
 # edit_transaction_dialog.py
+from __future__ import annotations # 注解不在运行时求值
 import sys
 from PyQt6.QtWidgets import (
     QDialog, QDialogButtonBox, QVBoxLayout, QGridLayout, 
     QLabel, QLineEdit, QSpinBox, QMessageBox, 
     QComboBox, QApplication, QDateTimeEdit
 )
-from PyQt6.QtCore import Qt, QDateTime
-from typing import Dict
+from PyQt6.QtCore import Qt, QDateTime, QDate, QTime
 import db_manager 
+from db_worker import run_in_background
 from datetime import datetime
 
+# 静态样式表 (模块常量，避免每次打开对话框时重新拼接字符串)
+_STYLE_ITEM_NAME = "font-weight: bold; color: #333;"
+_STYLE_ITEM_REF = "color: #666;"
+_STYLE_IN = "font-weight: bold; color: #4CAF50;"
+_STYLE_OUT = "font-weight: bold; color: #f44336;"
+_STYLE_SEPARATOR = "border-bottom: 2px solid #ccc; margin: 10px 0;"
+_STYLE_WARNING = "color: #ff9800; font-weight: bold; padding: 10px; border: 1px solid #ff9800; border-radius: 5px; background-color: #fff3e0;"
+
+class _LazyCalendarDateTimeEdit(QDateTimeEdit):
+    """
+    首次获得焦点时才启用日历弹窗。setCalendarPopup(True) 会立即创建 QCalendarWidget，
+    而多数修改不涉及日期，延迟创建可缩短对话框打开时间。
+    """
+    def focusInEvent(self, event):
+        if not self.calendarPopup():
+            self.setCalendarPopup(True)
+        super().focusInEvent(event)
+
+
 class EditTransactionDialog(QDialog):
     """
     修改交易记录的对话框
@@ -20,9 +40,10 @@ class EditTransactionDialog(QDialog):
         self.db_path = db_path
         self.tx_id = tx_id
         self.setWindowTitle(f"修改交易记录 (ID: {tx_id})")
+        self._save_task = None # 进行中的后台保存任务
         
-        # 获取原始交易记录
-        self.original_transaction = db_manager.get_transaction_by_id(self.db_path, tx_id)
+        # 获取原始交易记录和项目选项 (一次数据库往返)
+        self.original_transaction, self.project_options = db_manager.get_transaction_edit_bundle(self.db_path, tx_id)
         
         if not self.original_transaction:
             QMessageBox.critical(self, "错误", f"无法找到 ID 为 {tx_id} 的交易记录。")
@@ -44,28 +65,27 @@ class EditTransactionDialog(QDialog):
         # 显示物品名称（不可修改）
         info_layout.addWidget(QLabel("物品名称:"), 0, 0, Qt.AlignmentFlag.AlignLeft)
         self.item_name_label = QLabel(self.original_transaction['item_name'])
-        self.item_name_label.setStyleSheet("font-weight: bold; color: #333;")
+        self.item_name_label.setStyleSheet(_STYLE_ITEM_NAME)
         info_layout.addWidget(self.item_name_label, 0, 1)
         
         # 显示物品型号（不可修改）
         info_layout.addWidget(QLabel("物品型号:"), 1, 0, Qt.AlignmentFlag.AlignLeft)
         self.item_ref_label = QLabel(self.original_transaction['item_ref'])
-        self.item_ref_label.setStyleSheet("color: #666;")
+        self.item_ref_label.setStyleSheet(_STYLE_ITEM_REF)
         info_layout.addWidget(self.item_ref_label, 1, 1)
         
         # 显示交易类型（不可修改）
         info_layout.addWidget(QLabel("交易类型:"), 2, 0, Qt.AlignmentFlag.AlignLeft)
         tx_type_text = "入库 (IN)" if self.original_type == 'IN' else "出库 (OUT)"
         self.type_label = QLabel(tx_type_text)
-        self.type_label.setStyleSheet("font-weight: bold; color: " + 
-                                      ("#4CAF50" if self.original_type == 'IN' else "#f44336") + ";")
+        self.type_label.setStyleSheet(_STYLE_IN if self.original_type == 'IN' else _STYLE_OUT)
         info_layout.addWidget(self.type_label, 2, 1)
         
         main_layout.addLayout(info_layout)
         
         # 分隔线
         separator = QLabel()
-        separator.setStyleSheet("border-bottom: 2px solid #ccc; margin: 10px 0;")
+        separator.setStyleSheet(_STYLE_SEPARATOR)
         main_layout.addWidget(separator)
         
         # 可修改字段
@@ -73,18 +93,24 @@ class EditTransactionDialog(QDialog):
         
         # A. 日期时间（可修改）
         form_layout.addWidget(QLabel("日期时间:"), 0, 0, Qt.AlignmentFlag.AlignLeft)
-        self.datetime_edit = QDateTimeEdit()
-        self.datetime_edit.setCalendarPopup(True)
+        self.datetime_edit = _LazyCalendarDateTimeEdit() # 日历弹窗在首次获得焦点时启用
         self.datetime_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
         
-        # 解析原始日期时间
-        try:
-            original_dt = QDateTime.fromString(self.original_transaction['date'], 'yyyy-MM-dd HH:mm:ss')
-            if original_dt.isValid():
-                self.datetime_edit.setDateTime(original_dt)
-            else:
-                self.datetime_edit.setDateTime(QDateTime.currentDateTime())
-        except:
+        # 解析原始日期时间：ISO 字符串由 datetime.fromisoformat 解析，再按年月日时分秒直接构造 QDateTime
+        # 日期为空时直接使用当前时间，不进入 try/except
+        dt = None
+        date_text = self.original_transaction.get('date')
+        if date_text:
+            try:
+                dt = datetime.fromisoformat(date_text)
+            except (ValueError, TypeError):
+                dt = None
+        
+        if dt is not None:
+            self.datetime_edit.setDateTime(
+                QDateTime(QDate(dt.year, dt.month, dt.day), QTime(dt.hour, dt.minute, dt.second))
+            )
+        else:
             self.datetime_edit.setDateTime(QDateTime.currentDateTime())
         
         form_layout.addWidget(self.datetime_edit, 0, 1)
@@ -104,37 +130,33 @@ class EditTransactionDialog(QDialog):
         self.recipient_entry.setPlaceholderText("请输入采购地/柜号/员工姓名...")
         form_layout.addWidget(self.recipient_entry, 2, 1)
         
-        # D. 项目参考（仅出库时显示，可修改）
-        self.project_label = QLabel("项目:")
-        self.project_combo = QComboBox()
-        
-        # 动态从数据库加载项目选项
-        project_options = db_manager.get_config_options(self.db_path, 'PROJECT')
-        
-        if not project_options:
-            project_options = ["", "别墅", "办公楼", "基地", "其他"]
-        
-        self.project_combo.addItems(project_options)
-        
-        # 设置当前项目值
-        current_project = self.original_transaction.get('project_ref', '')
-        idx = self.project_combo.findText(current_project)
-        if idx >= 0:
-            self.project_combo.setCurrentIndex(idx)
-        
-        form_layout.addWidget(self.project_label, 3, 0, Qt.AlignmentFlag.AlignLeft)
-        form_layout.addWidget(self.project_combo, 3, 1)
-        
-        # 根据交易类型控制"项目"输入框的可见性
-        if self.original_type == 'IN':
-            self.project_label.setVisible(False)
-            self.project_combo.setVisible(False)
+        # D. 项目参考（仅出库时创建，可修改；入库记录不需要项目，也不加载选项）
+        if self.original_type == 'OUT':
+            self.project_label = QLabel("项目:")
+            self.project_combo = QComboBox()
+            
+            # 项目选项已在 __init__ 中随交易记录一并读取
+            project_options = self.project_options
+            
+            if not project_options:
+                project_options = ["", "别墅", "办公楼", "基地", "其他"]
+            
+            self.project_combo.addItems(project_options)
+            
+            # 设置当前项目值
+            current_project = self.original_transaction.get('project_ref', '')
+            idx = self.project_combo.findText(current_project)
+            if idx >= 0:
+                self.project_combo.setCurrentIndex(idx)
+            
+            form_layout.addWidget(self.project_label, 3, 0, Qt.AlignmentFlag.AlignLeft)
+            form_layout.addWidget(self.project_combo, 3, 1)
         
         main_layout.addLayout(form_layout)
         
         # 警告提示
         warning_label = QLabel("⚠️ 注意：修改记录将自动调整库存！")
-        warning_label.setStyleSheet("color: #ff9800; font-weight: bold; padding: 10px; border: 1px solid #ff9800; border-radius: 5px; background-color: #fff3e0;")
+        warning_label.setStyleSheet(_STYLE_WARNING)
         main_layout.addWidget(warning_label)
         
         # 按钮栏
@@ -152,7 +174,7 @@ class EditTransactionDialog(QDialog):
         
         main_layout.addWidget(self.buttonBox)
 
-    def accept_action(self):
+    def accept_action(self, *_):
         """当用户点击确认按钮时执行的操作：更新交易记录"""
         
         # 1. 验证输入
@@ -200,22 +222,54 @@ class EditTransactionDialog(QDialog):
             if reply != QMessageBox.StandardButton.Yes:
                 return
         
-        # 5. 调用数据库管理器更新交易
-        success = db_manager.update_transaction(
+        # 5. 调用数据库管理器更新交易 (后台线程执行，期间禁用按钮)
+        self.buttonBox.setEnabled(False)
+        self.ok_button.setText("保存中...")
+        self._save_task = run_in_background(
+            db_manager.update_transaction,
             db_path=self.db_path,
             tx_id=self.tx_id,
             quantity=new_quantity,
             date=new_date,
             recipient_source=recipient_source,
-            project_ref=project_ref
+            project_ref=project_ref,
+            on_finished=self._on_save_finished,
+            on_failed=self._on_save_failed
         )
-        
+
+    def _on_save_finished(self, success: bool):
+        """后台更新完成 (UI 线程)。"""
+        self._save_task = None
         if success:
             super().accept()
         else:
+            self._restore_buttons()
             QMessageBox.critical(self, "修改失败", 
                                "修改交易失败！可能是库存不足，或数据库发生错误。")
 
+    def _on_save_failed(self, error: str):
+        """后台更新抛出异常 (UI 线程)。"""
+        self._save_task = None
+        self._restore_buttons()
+        QMessageBox.critical(self, "修改失败", f"修改交易失败！错误：{error}")
+
+    def _restore_buttons(self):
+        self.ok_button.setText("确认修改")
+        self.buttonBox.setEnabled(True)
+
+    def reject(self):
+        # 后台保存进行中时忽略 Esc / 取消，否则写入已提交而调用方却收到 Rejected
+        if self._save_task is not None:
+            return
+        super().reject()
+
+    def closeEvent(self, event):
+        # 后台保存进行中时忽略窗口关闭按钮
+        if self._save_task is not None:
+            event.ignore()
+            return
+        super().closeEvent(event)
+
 
 # --- 测试代码 ---
 if __name__ == '__main__':
@@ -1,20 +1,301 @@
 # inventory_page.py
 import sys
+import bisect
+from operator import itemgetter
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-    QTableWidget, QTableWidgetItem, QHeaderView, QLineEdit,
+    QTableView, QHeaderView, QLineEdit,
     QMessageBox, QApplication, QLabel, QDialog, QFileDialog,
     QComboBox
 )
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QColor
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QBrush
 import os
+import sqlite3
 # 导入数据库管理器
 import db_manager 
+from db_worker import run_in_background
 from add_item_dialog import AddItemDialog 
 from edit_item_dialog import EditItemDialog 
 from batch_edit_dialog import BatchEditDialog
 
+# data() 中频繁比较的角色常量，预先解析为模块常量
+_DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+_BACKGROUND_ROLE = Qt.ItemDataRole.BackgroundRole
+
+
+def _load_first_page(db_path: str, filters: dict, limit: int):
+    """
+    在线程池中执行：返回 (满足条件的总数, 前 limit 行, 不带筛选的总数)。
+    """
+    total = db_manager.count_inventory(db_path, **filters)
+    rows = db_manager.get_inventory_page(db_path, limit, 0, **filters)
+    filtered = filters['search'] or any(
+        filters[key] and filters[key] != 'ALL' for key in ('category', 'domain', 'location')
+    )
+    unfiltered_total = db_manager.count_inventory(db_path) if filtered else total
+    return total, rows, unfiltered_total
+
+class InventoryTableModel(QAbstractTableModel):
+    """
+    库存表格模型：按页从 SQLite 读取数据 (LIMIT/OFFSET)，视图滚动到底部时
+    通过 canFetchMore/fetchMore 加载下一页；搜索和筛选条件直接作为 SQL 条件执行。
+    第一页 (及计数) 在线程池中查询，完成后发出 loaded 信号，失败时发出 load_failed 信号。
+    """
+    loaded = pyqtSignal()
+    load_failed = pyqtSignal(str) # 错误信息
+
+    # 列定义: (表头, 字段键)；'status' 为计算列。ID 不作为列显示，通过 row_data()['id'] 获取
+    COLUMNS = [
+        ("名称 (Name)", 'name'), ("物品型号 (Ref)", 'reference'),
+        ("材料类别", 'category'), ("专业类别", 'domain'), ("单位 (Unit)", 'unit'),
+        ("当前库存", 'current_stock'), ("最小库存", 'min_stock'), ("储存位置", 'location'),
+        ("库存状态", 'status')
+    ]
+    # 一次调用按列顺序取出一行的全部字段 (元组)，代替逐列按键查找
+    _CELL_VALUES = itemgetter(*[key for _, key in COLUMNS[:-1]])
+
+    # 库存状态: 0 正常 / 1 预警 / 2 缺货
+    STATUS_TEXTS = ("正常", "预警", "缺货")
+    # 背景直接返回共享的 QBrush，委托绘制时无需再由 QColor 转换
+    STATUS_BRUSHES = (QBrush(QColor(255, 255, 255)), QBrush(QColor(255, 240, 192)), QBrush(QColor(255, 179, 179)))
+
+    PAGE_SIZE = 200 # 每次从数据库读取的行数
+
+    def __init__(self, db_path: str, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self._rows = []
+        self._status = []
+        self._cells = [] # 每行预先格式化好的单元格文本
+        self._search_keys = [] # 每行小写的 (名称, 型号)，内存筛选时不再逐行 lower()
+        self._filters = {}
+        self._total = 0 # 满足当前筛选条件的总行数
+        self._unfiltered_total = 0 # 不带筛选的总行数
+        self._generation = 0 # 每次查询递增，丢弃过期的后台结果
+        self._load_tasks = {} # generation -> DbTask，任务完成前保持引用
+
+    @staticmethod
+    def _status_of(item) -> int:
+        """本地修改后的行重新计算库存状态 (与 db_manager.SQL_STOCK_STATUS 一致)"""
+        if item['current_stock'] <= 0:
+            return 2
+        return 1 if item['current_stock'] <= item['min_stock'] else 0
+
+    def _format_row(self, item):
+        """一行的库存状态 (SQL 查询已计算的 status_code) 和各列显示文本，data() 只做下标查找"""
+        status = item['status_code']
+        cells = tuple('' if value is None else str(value) for value in self._CELL_VALUES(item))
+        return status, cells + (self.STATUS_TEXTS[status],)
+
+    @staticmethod
+    def _search_key(item):
+        """搜索用的小写 (名称, 型号)"""
+        return (item['name'] or '').lower(), (item['reference'] or '').lower()
+
+    def _append_rows(self, items):
+        """追加行 (加载时一次算好状态、显示文本和搜索键)"""
+        for item in items:
+            status, cells = self._format_row(item)
+            self._rows.append(item)
+            self._status.append(status)
+            self._cells.append(cells)
+            self._search_keys.append(self._search_key(item))
+
+    def _matches(self, item, search_key=None) -> bool:
+        """判断物品是否满足当前筛选条件 (与 db_manager._inventory_filter_clause 的 SQL 条件一致)"""
+        search = self._filters.get('search')
+        if search:
+            name, reference = search_key or self._search_key(item)
+            if search not in name and search not in reference:
+                return False
+        for key in ('category', 'domain', 'location'):
+            value = self._filters.get(key)
+            if value and value != 'ALL' and item.get(key) != value:
+                return False
+        return True
+
+    def _row_of(self, item_id):
+        """已加载行中 id 对应的行号，未加载时返回 None"""
+        for row, item in enumerate(self._rows):
+            if item['id'] == item_id:
+                return row
+        return None
+
+    def _remove_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row], self._status[row], self._cells[row], self._search_keys[row]
+        self.endRemoveRows()
+        self._total -= 1
+
+    def _insert_sorted(self, item):
+        """按 ORDER BY name, id 的顺序插入一行；位置在已加载窗口之后时留给 fetchMore 加载"""
+        keys = [(r['name'], r['id']) for r in self._rows]
+        row = bisect.bisect_left(keys, (item['name'], item['id']))
+        self._total += 1
+        if row == len(self._rows) and len(self._rows) < self._total - 1:
+            return
+        status, cells = self._format_row(item)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, item)
+        self._status.insert(row, status)
+        self._cells.insert(row, cells)
+        self._search_keys.insert(row, self._search_key(item))
+        self.endInsertRows()
+
+    def insert_row(self, item):
+        """新增物品后局部插入，不重新查询数据库"""
+        item['status_code'] = self._status_of(item)
+        if self._matches(item):
+            self._insert_sorted(item)
+
+    def update_row(self, item):
+        """物品修改后局部更新：排序位置不变时只刷新该行，否则移动到新位置"""
+        row = self._row_of(item['id'])
+        if row is None:
+            return
+        item['status_code'] = self._status_of(item)
+        old = self._rows[row]
+        if not self._matches(item):
+            self._remove_row(row)
+        elif old['name'] == item['name']:
+            self._rows[row] = item
+            self._status[row], self._cells[row] = self._format_row(item)
+            self._search_keys[row] = self._search_key(item)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+        else:
+            self._remove_row(row)
+            self._insert_sorted(item)
+
+    def remove_ids(self, item_ids):
+        """删除物品后局部移除对应行"""
+        ids = set(item_ids)
+        for row in range(len(self._rows) - 1, -1, -1):
+            if self._rows[row]['id'] in ids:
+                self._remove_row(row)
+
+    def set_query(self, search=None, category=None, domain=None, location=None):
+        """
+        设置筛选条件并重新加载第一页。
+        条件未变时 (刷新) 一次性重新加载已加载的行数，以便视图保持滚动位置。
+        """
+        filters = {'search': search, 'category': category, 'domain': domain, 'location': location}
+        if self._is_narrowing(filters):
+            # 结果集必为当前已全部加载结果的子集：直接在内存中筛选，不再查询数据库
+            self._filters = filters
+            self.beginResetModel()
+            keep = [row for row, item in enumerate(self._rows) if self._matches(item, self._search_keys[row])]
+            self._rows = [self._rows[row] for row in keep]
+            self._status = [self._status[row] for row in keep]
+            self._cells = [self._cells[row] for row in keep]
+            self._search_keys = [self._search_keys[row] for row in keep]
+            self._total = len(self._rows)
+            self.endResetModel()
+            self.loaded.emit()
+            return
+        limit = max(self.PAGE_SIZE, len(self._rows)) if filters == self._filters else self.PAGE_SIZE
+        self._filters = filters
+        self._generation += 1
+        generation = self._generation
+        self._load_tasks[generation] = run_in_background(
+            _load_first_page, self.db_path, filters, limit,
+            on_finished=lambda result: self._on_first_page(generation, result),
+            on_failed=lambda error: self._on_load_failed(generation, error)
+        )
+
+    def is_loading(self) -> bool:
+        """是否有尚未返回的后台查询"""
+        return bool(self._load_tasks)
+
+    def _on_first_page(self, generation: int, result):
+        """后台查询完成 (UI 线程)：只采用最新一次查询的结果"""
+        self._load_tasks.pop(generation, None)
+        if generation != self._generation:
+            return
+        total, rows, self._unfiltered_total = result
+        self.beginResetModel()
+        self._total = total
+        self._rows, self._status, self._cells, self._search_keys = [], [], [], []
+        self._append_rows(rows)
+        self.endResetModel()
+        self.loaded.emit()
+
+    def _on_load_failed(self, generation: int, error: str):
+        self._load_tasks.pop(generation, None)
+        print(f"数据库错误：加载库存失败：{error}")
+        if generation == self._generation:
+            self.load_failed.emit(error)
+
+    def _is_narrowing(self, filters) -> bool:
+        """
+        仅搜索文本变长 (新文本包含旧文本)，其余条件不变，且当前结果已全部加载时，
+        新结果一定是当前结果的子集。
+        """
+        if not self._filters or self.is_loading() or len(self._rows) != self._total:
+            return False
+        if any(filters[key] != self._filters[key] for key in ('category', 'domain', 'location')):
+            return False
+        old_search = self._filters['search'] or ''
+        new_search = filters['search'] or ''
+        return new_search != old_search and old_search in new_search
+
+    def reload(self):
+        """按当前筛选条件重新加载"""
+        self.set_query(**self._filters)
+
+    def total_count(self) -> int:
+        """满足当前筛选条件的总行数 (含尚未加载的行)"""
+        return self._total
+
+    def unfiltered_count(self) -> int:
+        """最近一次加载时不带筛选的总行数"""
+        return self._unfiltered_total
+
+    def row_data(self, row: int) -> dict:
+        """返回第 row 行的物品数据字典 (只读引用)"""
+        return self._rows[row]
+
+    def row_dict(self, row: int) -> dict:
+        """返回第 row 行物品数据的浅拷贝 (保留原始 int 类型)，可交给对话框修改"""
+        return dict(self._rows[row])
+
+    def canFetchMore(self, parent=QModelIndex()):
+        # 后台查询进行中时 _rows 仍是旧条件的数据，不能按新条件续页
+        return not parent.isValid() and not self._load_tasks and len(self._rows) < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = db_manager.get_inventory_page(self.db_path, self.PAGE_SIZE, len(self._rows), **self._filters)
+        if not page:
+            # 数据在加载期间被删除，停止继续加载
+            self._total = len(self._rows)
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._append_rows(page)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=_DISPLAY_ROLE):
+        # 先按角色分派：视图对每个单元格查询十余种角色，其余角色无需检查 index
+        if role == _DISPLAY_ROLE:
+            return self._cells[index.row()][index.column()] if index.isValid() else None
+        if role == _BACKGROUND_ROLE:
+            return self.STATUS_BRUSHES[self._status[index.row()]] if index.isValid() else None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+
 class InventoryPage(QWidget):
     """
     库存管理界面：展示和操作 Inventory 表数据。
@@ -22,10 +303,27 @@ class InventoryPage(QWidget):
     新增：支持多选和批量编辑功能，以及刷新按钮。
     扩展：增加类别、专业、储存位置筛选功能。
     """
+    # 页面样式表：按钮按 objectName 设置样式，只解析一次，代替逐个按钮调用 setStyleSheet
+    PAGE_STYLE = (
+        "QPushButton#inventory_refresh_btn { background-color: #FF9800; color: white; font-weight: bold; padding: 8px; }"
+        "QPushButton#inventory_add_btn { background-color: #4CAF50; color: white; font-weight: bold; padding: 8px; }"
+        "QPushButton#inventory_edit_btn { background-color: #2196F3; color: white; padding: 8px; }"
+        "QPushButton#inventory_batch_edit_btn { background-color: #9C27B0; color: white; font-weight: bold; padding: 8px; }"
+        "QPushButton#inventory_del_btn { background-color: #f44336; color: white; padding: 8px; }"
+    )
+
+    # 各列默认宽度 (像素)；名称列 (0) 自动拉伸
+    COLUMN_WIDTHS = {1: 160, 2: 100, 3: 90, 4: 70, 5: 80, 6: 80, 7: 120, 8: 80}
+    ROW_HEIGHT = 24 # 行高 (像素)
+
     def __init__(self, db_path: str):
         super().__init__()
         self.db_path = db_path
-        self.all_data = []  # 存储所有数据用于筛选
+        self._last_filters = None # 上一次查询使用的 (搜索文本, 类别, 专业, 储存位置)
+        self._combo_options = {}  # 各筛选下拉框当前的选项 (不含 ALL)
+        self._data_version = None # 上次加载时的数据库数据版本
+        self._pending_scroll = None # 重新加载完成后恢复的滚动位置
+        self._refresh_requested = False
         self.init_ui()
         self.load_inventory_data()
 
@@ -38,7 +336,12 @@ class InventoryPage(QWidget):
         # 搜索框
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入物品名称或型号进行搜索...")
-        self.search_input.textChanged.connect(self.filter_data)
+        # 搜索防抖：停止输入 200ms 后才重新查询数据库，而不是每个按键都查询
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(200)
+        self._search_timer.timeout.connect(self.filter_data)
+        self.search_input.textChanged.connect(self._search_timer.start)
         toolbar_layout.addWidget(self.search_input)
         
         # 类别筛选
@@ -67,7 +370,7 @@ class InventoryPage(QWidget):
         
         # 刷新按钮
         self.refresh_btn = QPushButton("🔄 刷新")
-        self.refresh_btn.setStyleSheet("background-color: #FF9800; color: white; font-weight: bold; padding: 8px;")
+        self.refresh_btn.setObjectName("inventory_refresh_btn")
         self.refresh_btn.setToolTip("从数据库重新加载最新数据")
         self.refresh_btn.clicked.connect(self.refresh_data)
         toolbar_layout.addWidget(self.refresh_btn)
@@ -80,11 +383,12 @@ class InventoryPage(QWidget):
         self.batch_edit_btn = QPushButton("批量编辑")
         self.del_btn = QPushButton("删除物品")
         
-        # 设置按钮样式
-        self.add_btn.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold; padding: 8px;")
-        self.edit_btn.setStyleSheet("background-color: #2196F3; color: white; padding: 8px;")
-        self.batch_edit_btn.setStyleSheet("background-color: #9C27B0; color: white; font-weight: bold; padding: 8px;")
-        self.del_btn.setStyleSheet("background-color: #f44336; color: white; padding: 8px;")
+        # 设置按钮样式 (按 objectName 匹配页面样式表 PAGE_STYLE)
+        self.add_btn.setObjectName("inventory_add_btn")
+        self.edit_btn.setObjectName("inventory_edit_btn")
+        self.batch_edit_btn.setObjectName("inventory_batch_edit_btn")
+        self.del_btn.setObjectName("inventory_del_btn")
+        self.setStyleSheet(self.PAGE_STYLE)
         
         # 连接信号
         self.add_btn.clicked.connect(self.add_item_dialog)
@@ -99,23 +403,27 @@ class InventoryPage(QWidget):
         
         main_layout.addLayout(toolbar_layout)
 
-        # --- 2. 主数据表格 ---
-        self.inventory_table = QTableWidget()
-        self.inventory_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.inventory_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.inventory_table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
-
-        # 定义表头（新增 domain 列）
-        self.headers = [
-            "ID", "名称 (Name)", "物品型号 (Ref)", "材料类别", "专业类别", "单位 (Unit)", 
-            "当前库存", "最小库存", "储存位置", "库存状态"
-        ]
-        self.inventory_table.setColumnCount(len(self.headers))
-        self.inventory_table.setHorizontalHeaderLabels(self.headers)
-        
-        # 调整列宽
-        self.inventory_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.inventory_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        # --- 2. 主数据表格 (模型/视图，分页加载) ---
+        self.inventory_model = InventoryTableModel(self.db_path, self)
+        
+        self.inventory_table = QTableView()
+        self.inventory_table.setModel(self.inventory_model)
+        self.inventory_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.inventory_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.inventory_table.setSelectionMode(QTableView.SelectionMode.ExtendedSelection)
+        
+        # 调整列宽：固定默认宽度 (可手动拖动)，不使用 ResizeToContents，避免每加载一页都重新测量所有单元格
+        header = self.inventory_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        for col, width in self.COLUMN_WIDTHS.items():
+            self.inventory_table.setColumnWidth(col, width)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        
+        # 固定行高，视图无需逐行测量高度；行背景由模型提供，关闭交替行颜色
+        self.inventory_table.setAlternatingRowColors(False)
+        vertical_header = self.inventory_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        vertical_header.setDefaultSectionSize(self.ROW_HEIGHT)
         
         main_layout.addWidget(self.inventory_table)
         
@@ -124,144 +432,128 @@ class InventoryPage(QWidget):
         self.status_label.setStyleSheet("padding: 5px; font-weight: bold;")
         main_layout.addWidget(self.status_label)
         
-        # 连接选择变化信号
-        self.inventory_table.itemSelectionChanged.connect(self.update_status_label)
+        # 后台加载完成后更新状态栏
+        self.inventory_model.loaded.connect(self._on_inventory_loaded)
+        self.inventory_model.load_failed.connect(self._on_inventory_load_failed)
+        
+        # 连接选择变化信号 (selectionModel 在 setModel 之后才可用)
+        # 拖动多选时 selectionChanged 连续触发，合并为 50ms 后更新一次状态栏
+        self._selection_timer = QTimer(self)
+        self._selection_timer.setSingleShot(True)
+        self._selection_timer.setInterval(50)
+        self._selection_timer.timeout.connect(self.update_status_label)
+        self.inventory_table.selectionModel().selectionChanged.connect(self._selection_timer.start)
 
 
-    def load_inventory_data(self):
-        """从数据库加载数据并填充表格"""
-        data = db_manager.get_all_inventory(self.db_path)
-        
-        # 保存所有数据用于筛选
-        self.all_data = data
+    def load_inventory_data(self) -> bool:
+        """
+        从数据库重新加载筛选选项和表格第一页 (表格数据在后台线程查询)。
+        数据库自上次加载后未修改时跳过，返回 False。
+        """
+        try:
+            version = db_manager.get_data_version(self.db_path)
+        except sqlite3.Error as e:
+            print(f"数据库错误：读取数据版本失败：{e}")
+            version = None
+        if version is not None and version == self._data_version:
+            return False
+        self._data_version = version
         
         # 刷新筛选下拉框选项
         self._refresh_filter_dropdowns()
         
-        # 填充表格
-        self._populate_table(data)
-        
-        # 应用当前筛选
+        # 按当前筛选条件加载表格 (清除上次条件，强制重新查询)，加载完成后恢复滚动位置
+        self._pending_scroll = self.inventory_table.verticalScrollBar().value()
+        self._last_filters = None
         self.filter_data()
+        return True
 
 
     def _refresh_filter_dropdowns(self):
-        """刷新筛选下拉框的选项"""
-        if not self.all_data:
-            return
+        """刷新筛选下拉框的选项 (类别、专业、储存位置的唯一值由数据库去重排序)"""
+        options = db_manager.get_inventory_filter_options(self.db_path)
         
-        # 保存当前选择
-        current_category = self.category_filter_combo.currentText()
-        current_domain = self.domain_filter_combo.currentText()
-        current_location = self.location_filter_combo.currentText()
-        
-        # 提取所有唯一的类别
-        categories = set()
-        for item in self.all_data:
-            category = item.get('category', '').strip()
-            if category:
-                categories.add(category)
-        
-        # 提取所有唯一的专业
-        domains = set()
-        for item in self.all_data:
-            domain = item.get('domain', '').strip()
-            if domain:
-                domains.add(domain)
-        
-        # 提取所有唯一的储存位置
-        locations = set()
-        for item in self.all_data:
-            location = item.get('location', '').strip()
-            if location:
-                locations.add(location)
-        
-        # 更新类别下拉框
-        self.category_filter_combo.blockSignals(True)
-        self.category_filter_combo.clear()
-        self.category_filter_combo.addItem("ALL")
-        self.category_filter_combo.addItems(sorted(list(categories)))
-        cat_index = self.category_filter_combo.findText(current_category)
-        if cat_index >= 0:
-            self.category_filter_combo.setCurrentIndex(cat_index)
-        self.category_filter_combo.blockSignals(False)
-        
-        # 更新专业下拉框
-        self.domain_filter_combo.blockSignals(True)
-        self.domain_filter_combo.clear()
-        self.domain_filter_combo.addItem("ALL")
-        self.domain_filter_combo.addItems(sorted(list(domains)))
-        dom_index = self.domain_filter_combo.findText(current_domain)
-        if dom_index >= 0:
-            self.domain_filter_combo.setCurrentIndex(dom_index)
-        self.domain_filter_combo.blockSignals(False)
-        
-        # 更新储存位置下拉框
-        self.location_filter_combo.blockSignals(True)
-        self.location_filter_combo.clear()
-        self.location_filter_combo.addItem("ALL")
-        self.location_filter_combo.addItems(sorted(list(locations)))
-        loc_index = self.location_filter_combo.findText(current_location)
-        if loc_index >= 0:
-            self.location_filter_combo.setCurrentIndex(loc_index)
-        self.location_filter_combo.blockSignals(False)
+        self._update_filter_combo(self.category_filter_combo, options['category'])
+        self._update_filter_combo(self.domain_filter_combo, options['domain'])
+        self._update_filter_combo(self.location_filter_combo, options['location'])
 
 
-    def _populate_table(self, data):
-        """填充表格数据"""
-        self.inventory_table.setRowCount(len(data))
-        
-        # 定义颜色常量
-        critical_color = QColor(255, 179, 179)
-        warning_color = QColor(255, 240, 192)
-        default_color = QColor(255, 255, 255)
-        
-        for row_index, item in enumerate(data):
-            
-            # 检查库存预警状态
-            current = item['current_stock']
-            minimum = item['min_stock']
-            status_text = "正常"
-            
-            color = default_color
-            if current <= 0:
-                status_text = "缺货"
-                color = critical_color
-            elif current <= minimum:
-                status_text = "预警"
-                color = warning_color
-            
-            # 填充表格行（新增 domain 列）
-            self.inventory_table.setItem(row_index, 0, QTableWidgetItem(str(item['id'])))
-            self.inventory_table.setItem(row_index, 1, QTableWidgetItem(item['name']))
-            self.inventory_table.setItem(row_index, 2, QTableWidgetItem(item['reference']))
-            self.inventory_table.setItem(row_index, 3, QTableWidgetItem(item.get('category', '其他')))
-            self.inventory_table.setItem(row_index, 4, QTableWidgetItem(item.get('domain', '其他')))  # 新增
-            self.inventory_table.setItem(row_index, 5, QTableWidgetItem(item['unit']))
-            self.inventory_table.setItem(row_index, 6, QTableWidgetItem(str(current)))
-            self.inventory_table.setItem(row_index, 7, QTableWidgetItem(str(minimum)))
-            self.inventory_table.setItem(row_index, 8, QTableWidgetItem(item['location']))
-            self.inventory_table.setItem(row_index, 9, QTableWidgetItem(status_text))
-            
-            # 应用行颜色
-            for col in range(self.inventory_table.columnCount()):
-                self.inventory_table.item(row_index, col).setBackground(color)
-            
-            # 隐藏 ID 列
-            self.inventory_table.setColumnHidden(0, True)
+    def _update_filter_combo(self, combo: QComboBox, values):
+        """选项与上次相同时不重建下拉框；否则重建并保留当前选择"""
+        values = tuple(values)
+        if self._combo_options.get(combo) == values:
+            return
+        self._combo_options[combo] = values
+        
+        current = combo.currentText()
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItem("ALL")
+        combo.addItems(values)
+        index = combo.findText(current)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        combo.blockSignals(False)
+
+
+    def _confirm(self, title: str, text: str, default_yes: bool = False) -> bool:
+        """弹出 是/否 确认框，用户选择“是”时返回 True"""
+        buttons = QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        default = QMessageBox.StandardButton.Yes if default_yes else QMessageBox.StandardButton.No
+        return QMessageBox.question(self, title, text, buttons, default) == QMessageBox.StandardButton.Yes
 
+
+    def _selected_items(self):
+        """返回选中行对应的物品数据字典列表 (按视图顺序)"""
+        rows = self.inventory_table.selectionModel().selectedRows()
+        return [self.inventory_model.row_data(index.row()) for index in rows]
+
+
+    def _after_local_change(self):
+        """局部修改模型后：刷新筛选下拉框选项 (仅一次 DISTINCT 查询) 和状态栏"""
+        self._refresh_filter_dropdowns()
+        # 当前选中的选项被移除时下拉框会回到 ALL，此时按新条件重新查询 (条件未变则直接返回)
+        self.filter_data()
         self.update_status_label()
 
 
     def refresh_data(self):
         """刷新按钮的处理函数：重新从数据库加载数据"""
-        self.load_inventory_data()
-        self.status_label.setText(f"数据已刷新 | 总计 {self.inventory_table.rowCount()} 条记录。")
+        if self.load_inventory_data():
+            # 状态栏在后台加载完成后更新
+            self._refresh_requested = True
+        else:
+            self.status_label.setText(f"数据已刷新 | 总计 {self.inventory_model.total_count()} 条记录。")
+
+
+    def _on_inventory_loaded(self):
+        """表格数据加载完成 (UI 线程)：恢复滚动位置并更新状态栏"""
+        if self._pending_scroll is not None:
+            self.inventory_table.verticalScrollBar().setValue(self._pending_scroll)
+            self._pending_scroll = None
+        
+        visible_count = self.inventory_model.total_count()
+        total_count = self.inventory_model.unfiltered_count()
+        if self._refresh_requested:
+            self._refresh_requested = False
+            self.status_label.setText(f"数据已刷新 | 总计 {visible_count} 条记录。")
+        elif visible_count < total_count:
+            self.status_label.setText(f"筛选结果：显示 {visible_count} / {total_count} 条记录。")
+        else:
+            self.status_label.setText(f"总计 {total_count} 条记录。")
+
 
+    def _on_inventory_load_failed(self, error: str):
+        """表格数据加载失败 (UI 线程)：清除已记录的数据版本，下次刷新时重新加载"""
+        self._data_version = None
+        self._pending_scroll = None
+        self._refresh_requested = False
+        self.status_label.setText(f"加载库存失败：{error}")
 
-    def update_status_label(self):
+
+    def update_status_label(self, *_):
         """更新状态栏，显示总记录数和选中数量"""
-        total_count = self.inventory_table.rowCount()
+        total_count = self.inventory_model.total_count()
         selected_count = len(self.inventory_table.selectionModel().selectedRows())
         
         if selected_count > 0:
@@ -270,65 +562,29 @@ class InventoryPage(QWidget):
             self.status_label.setText(f"总计 {total_count} 条记录。")
 
 
-    def filter_data(self):
-        """根据搜索框和筛选下拉框内容过滤表格行"""
+    def filter_data(self, *_):
+        """根据搜索框和筛选下拉框内容过滤表格行 (条件与上次相同时不重新查询)"""
         search_text = self.search_input.text().lower().strip()
         category_filter = self.category_filter_combo.currentText()
         domain_filter = self.domain_filter_combo.currentText()
         location_filter = self.location_filter_combo.currentText()
         
-        visible_count = 0
-        
-        for i in range(self.inventory_table.rowCount()):
-            name_item = self.inventory_table.item(i, 1)
-            ref_item = self.inventory_table.item(i, 2)
-            category_item = self.inventory_table.item(i, 3)
-            domain_item = self.inventory_table.item(i, 4)
-            location_item = self.inventory_table.item(i, 8)
-            
-            hide = False
-            
-            # 搜索框筛选
-            if search_text:
-                name_match = name_item and search_text in name_item.text().lower()
-                ref_match = ref_item and search_text in ref_item.text().lower()
-                if not (name_match or ref_match):
-                    hide = True
-            
-            # 类别筛选
-            if not hide and category_filter != "ALL":
-                if not category_item or category_item.text() != category_filter:
-                    hide = True
-            
-            # 专业筛选
-            if not hide and domain_filter != "ALL":
-                if not domain_item or domain_item.text() != domain_filter:
-                    hide = True
-            
-            # 储存位置筛选
-            if not hide and location_filter != "ALL":
-                if not location_item or location_item.text() != location_filter:
-                    hide = True
-            
-            self.inventory_table.setRowHidden(i, hide)
-            
-            if not hide:
-                visible_count += 1
+        filters = (search_text, category_filter, domain_filter, location_filter)
+        if filters == self._last_filters:
+            return
+        self._last_filters = filters
         
-        # 更新状态栏显示筛选结果
-        total_count = self.inventory_table.rowCount()
-        if visible_count < total_count:
-            self.status_label.setText(f"筛选结果：显示 {visible_count} / {total_count} 条记录。")
-        else:
-            self.status_label.setText(f"总计 {total_count} 条记录。")
+        # 筛选在 SQL 中执行，模型在后台只加载第一页；状态栏在 _on_inventory_loaded 中更新
+        self.inventory_model.set_query(search_text, category_filter, domain_filter, location_filter)
             
         
     def add_item_dialog(self):
         """显示新增物品对话框"""
         dialog = AddItemDialog(self.db_path, self)
         
-        if dialog.exec() == QDialog.DialogCode.Accepted: 
-            self.load_inventory_data()
+        if dialog.exec() == QDialog.DialogCode.Accepted and dialog.new_row is not None: 
+            self.inventory_model.insert_row(dialog.new_row)
+            self._after_local_change()
             
             
     def edit_item_dialog(self):
@@ -339,37 +595,22 @@ class InventoryPage(QWidget):
             return
         
         if len(selected_rows) > 1:
-            reply = QMessageBox.question(
-                self,
+            if self._confirm(
                 "多选提示",
                 f"您选中了 {len(selected_rows)} 个物品。\n\n是否使用批量编辑功能？ \n选择'否'将只编辑第一个选中的物品。",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                QMessageBox.StandardButton.Yes
-            )
-            
-            if reply == QMessageBox.StandardButton.Yes:
+                default_yes=True
+            ):
                 self.batch_edit_action()
                 return
             
-        row_index = selected_rows[0].row()
-        
-        # 提取选中行的数据（新增 domain 字段）
-        item_data = {
-            'id': int(self.inventory_table.item(row_index, 0).text()),
-            'name': self.inventory_table.item(row_index, 1).text(),
-            'reference': self.inventory_table.item(row_index, 2).text(),
-            'category': self.inventory_table.item(row_index, 3).text(),
-            'domain': self.inventory_table.item(row_index, 4).text(),  # 新增
-            'unit': self.inventory_table.item(row_index, 5).text(),
-            'current_stock': int(self.inventory_table.item(row_index, 6).text()),
-            'min_stock': int(self.inventory_table.item(row_index, 7).text()),
-            'location': self.inventory_table.item(row_index, 8).text()
-        }
+        # 直接取模型中的原始数据（副本），无需从单元格文本解析
+        item_data = self.inventory_model.row_dict(selected_rows[0].row())
         
         # 弹出编辑对话框
         dialog = EditItemDialog(self.db_path, item_data, self)
-        if dialog.exec() == QDialog.DialogCode.Accepted: 
-            self.load_inventory_data()
+        if dialog.exec() == QDialog.DialogCode.Accepted and dialog.updated_row is not None: 
+            self.inventory_model.update_row(dialog.updated_row)
+            self._after_local_change()
 
 
     def batch_edit_action(self):
@@ -381,34 +622,19 @@ class InventoryPage(QWidget):
             return
         
         if len(selected_rows) == 1:
-            reply = QMessageBox.question(self, "单选提示", "您只选中了一个物品。是否使用普通编辑功能？", 
-                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, 
-                                        QMessageBox.StandardButton.Yes)
-            if reply == QMessageBox.StandardButton.Yes:
+            if self._confirm("单选提示", "您只选中了一个物品。是否使用普通编辑功能？", default_yes=True):
                 self.edit_item_dialog()
             return
         
-        # 收集选中物品的完整信息（新增 domain 字段）
-        selected_items = []
-        for row_model_index in selected_rows:
-            row = row_model_index.row()
-            item_data = {
-                'id': int(self.inventory_table.item(row, 0).text()),
-                'name': self.inventory_table.item(row, 1).text(),
-                'reference': self.inventory_table.item(row, 2).text(),
-                'category': self.inventory_table.item(row, 3).text(),
-                'domain': self.inventory_table.item(row, 4).text(),  # 新增
-                'unit': self.inventory_table.item(row, 5).text(),
-                'current_stock': int(self.inventory_table.item(row, 6).text()),
-                'min_stock': int(self.inventory_table.item(row, 7).text()),
-                'location': self.inventory_table.item(row, 8).text()
-            }
-            selected_items.append(item_data)
+        # 收集选中物品的完整信息（模型数据副本）
+        selected_items = [self.inventory_model.row_dict(index.row()) for index in selected_rows]
         
         # 打开批量编辑对话框
         dialog = BatchEditDialog(self.db_path, selected_items, self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            self.load_inventory_data()
+            for row in dialog.updated_rows:
+                self.inventory_model.update_row(row)
+            self._after_local_change()
 
 
     def delete_item_action(self):
@@ -420,52 +646,38 @@ class InventoryPage(QWidget):
         
         # 支持多选删除
         if len(selected_rows) > 1:
-            reply = QMessageBox.question(
-                self,
+            if self._confirm(
                 "确认批量删除",
-                f"您确定要删除选中的 {len(selected_rows)} 个物品吗？\n\n⚠️ 注意：此操作将同时删除这些物品及其所有相关的交易记录！\n数据不可恢复！",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                QMessageBox.StandardButton.No
-            )
-            
-            if reply == QMessageBox.StandardButton.Yes:
-                success_count = 0
-                failed_count = 0
-                
-                for row_model_index in selected_rows:
-                    row = row_model_index.row()
-                    item_id = int(self.inventory_table.item(row, 0).text())
-                    
-                    if db_manager.delete_inventory_item(self.db_path, item_id):
-                        success_count += 1
-                    else:
-                        failed_count += 1
+                f"您确定要删除选中的 {len(selected_rows)} 个物品吗？\n\n⚠️ 注意：此操作将同时删除这些物品及其所有相关的交易记录！\n数据不可恢复！"
+            ):
+                # 一次事务批量删除 (DELETE ... WHERE id IN (...))
+                item_ids = [item['id'] for item in self._selected_items()]
+                success_count, failed_ids = db_manager.delete_inventory_items(self.db_path, item_ids)
+                failed_count = len(failed_ids)
                 
                 if failed_count == 0:
                     QMessageBox.information(self, "成功", f"成功删除了 {success_count} 个物品及其关联交易记录。")
                 else:
                     QMessageBox.warning(self, "部分失败", f"成功删除：{success_count} 个\n失败：{failed_count} 个")
                 
-                self.load_inventory_data()
+                # 只移除成功删除的行；数据库出错时事务已整体回滚，failed_ids 包含全部 ID
+                self.inventory_model.remove_ids(set(item_ids) - set(failed_ids))
+                self._after_local_change()
             return
             
         # 单个删除
-        row_index = selected_rows[0].row()
-        item_id = int(self.inventory_table.item(row_index, 0).text())
-        item_name = self.inventory_table.item(row_index, 1).text()
-        
-        reply = QMessageBox.question(
-            self, 
-            "确认删除", 
-            f"您确定要删除物品 **{item_name}** (ID: {item_id}) 吗？\n\n注意：此操作将同时删除该物品及其所有相关的交易记录，数据不可恢复！",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
+        item = self._selected_items()[0]
+        item_id = item['id']
+        item_name = item['name']
+        
+        if self._confirm(
+            "确认删除",
+            f"您确定要删除物品 **{item_name}** (ID: {item_id}) 吗？\n\n注意：此操作将同时删除该物品及其所有相关的交易记录，数据不可恢复！"
+        ):
             if db_manager.delete_inventory_item(self.db_path, item_id):
                 QMessageBox.information(self, "成功", "物品及关联交易记录已成功删除。")
-                self.load_inventory_data()
+                self.inventory_model.remove_ids([item_id])
+                self._after_local_change()
             else:
                 QMessageBox.critical(self, "删除失败", "删除失败！请检查数据库连接或确认该物品ID是否存在。")
 
@@ -12,7 +12,9 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QSettings
 from PyQt6.QtGui import QPixmap, QIcon 
+import db_manager
 from main import MainWindow # 导入 MainWindow 类
+from db_worker import run_in_background
 
 # --- 配置和常量 ---
 # 数据库文件名称
@@ -21,6 +23,9 @@ DB_FILE = f'{DB_NAME}.db'
 # 默认管理员凭证
 DEFAULT_LOGIN_USER = 'Honsen_Admin'
 DEFAULT_LOGIN_PASS_PLAINTEXT = '66778899HONSEN' 
+# bcrypt 代价因子：密钥扩展迭代 2^BCRYPT_COST 次。库默认为 12；10 的哈希耗时约为其 1/4，
+# 仍不低于常用的安全下限 (10)。代价因子保存在哈希串中，已有哈希 (含 12) 照常校验。
+BCRYPT_COST = 10
 
 # --- 资源文件名 ---
 LOGO_FILENAME = 'logo.png' 
@@ -65,8 +70,12 @@ def get_resource_path(relative_path):
 
 # --- 数据库操作：基础连接和工具函数 ---
 
-def get_db_connection(db_path, create_if_missing=False):
-    """根据提供的路径建立 SQLite 连接。"""
+def get_db_connection(db_path, create_if_missing=False, shared=False):
+    """
+    根据提供的路径建立 SQLite 连接。
+    shared=True 时返回 db_manager 为当前线程保留的长连接 (登录后主程序继续使用，页缓存保持预热)，
+    调用方不要关闭它；否则返回新连接，由调用方关闭。
+    """
     try:
         if not db_path:
             db_path = DB_FILE
@@ -78,17 +87,36 @@ def get_db_connection(db_path, create_if_missing=False):
                                  f"数据库文件 '{db_path}' 不存在。请点击 '初始化数据库' 按钮创建。")
             return None
 
-        # 尝试连接。
+        if shared:
+            return db_manager.get_conn(db_path)
+        
+        # 尝试连接，并使用与 db_manager 长连接相同的 PRAGMA 设置 (WAL、synchronous=NORMAL、页缓存等)
         conn = sqlite3.connect(db_path)
+        db_manager.apply_pragmas(conn)
         return conn
         
     except Exception as e:
         QMessageBox.critical(None, "数据库连接错误", f"无法连接数据库文件 '{db_path}'。\n错误: {e}")
         return None
 
+# 新建数据库写入的 PRAGMA user_version。下方建表语句的 transactions 外键已带 ON DELETE CASCADE，
+# 相当于 db_manager 迁移版本 1；其余索引由 db_manager.migrate_database 在主程序启动时补建。
+INITIAL_SCHEMA_VERSION = 1
+
+def is_schema_initialized(cursor):
+    """
+    判断数据库是否已初始化。user_version 大于 0 时直接返回 (读取文件头，无需查询 sqlite_master)；
+    为 0 时可能是本机制引入前初始化的旧库，再检查 admin_user 表是否存在。
+    """
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] > 0:
+        return True
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='admin_user'")
+    return cursor.fetchone() is not None
+
 def hash_password(password_plaintext):
-    """使用 bcrypt 对明文密码进行哈希"""
-    return bcrypt.hashpw(password_plaintext.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """使用 bcrypt 对明文密码进行哈希 (代价因子为 BCRYPT_COST)"""
+    return bcrypt.hashpw(password_plaintext.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_COST)).decode('utf-8')
 
 # --- 业务表初始化逻辑 (已修复插入语句) ---
 
@@ -99,14 +127,17 @@ def initialize_all_schema(conn):
     cursor = conn.cursor()
     
     try:
-        # 1. 检查 admin_user 表是否存在 (作为是否为新表的判断依据)
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='admin_user'")
-        if cursor.fetchone() is not None:
+        # 1. 检查数据库是否已初始化 (作为是否为新表的判断依据)
+        if is_schema_initialized(cursor):
             cursor.close()
             QMessageBox.information(None, "初始化提示", "数据库已存在，并非新数据库。跳过创建。")
             return
 
-        # 2. 如果不存在，则创建所有表
+        # 2. 如果不存在，则在一个显式事务中创建所有表并插入默认数据 (整个初始化只提交一次)
+        # 默认管理员密码的 bcrypt 哈希较慢，在开启事务前算好
+        hashed_pass = hash_password(DEFAULT_LOGIN_PASS_PLAINTEXT)
+        conn.isolation_level = None # 关闭隐式事务，由下面的 BEGIN/COMMIT 控制
+        cursor.execute("BEGIN")
         
         # A. admin_user 表 (用户管理)
         cursor.execute("""
@@ -118,7 +149,6 @@ def initialize_all_schema(conn):
         """)
         
         # B. 插入默认管理员账号
-        hashed_pass = hash_password(DEFAULT_LOGIN_PASS_PLAINTEXT)
         cursor.execute("INSERT INTO admin_user (username, password) VALUES (?, ?)", 
                              (DEFAULT_LOGIN_USER, hashed_pass))
         
@@ -148,7 +178,7 @@ def initialize_all_schema(conn):
                 quantity INTEGER NOT NULL,
                 recipient_source TEXT,
                 project_ref TEXT,
-                FOREIGN KEY (item_id) REFERENCES inventory(id)
+                FOREIGN KEY (item_id) REFERENCES inventory(id) ON DELETE CASCADE
             )
         """)
         
@@ -163,75 +193,73 @@ def initialize_all_schema(conn):
             );
         """)
 
-        # F. 插入默认存放位置选项
-        default_locations = ["基地仓库", "大仓库", "别墅", "办公楼", "公寓", "其他"]
-        for loc in default_locations:
-            cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", ('LOCATION', loc))
-            
-        # G. 插入默认项目选项
-        default_projects = ["日常维护", "别墅", "办公楼", "公寓", "基地", "通用"]
-        for proj in default_projects:
-            cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", ('PROJECT', proj))
-
-        # H. 插入默认单位选项
-        default_units = ["个", "件", "套", "米", "卷", "箱", "KG", "升", "桶", "其他"]
-        for unit in default_units:
-            cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", ('UNIT', unit))
-
-        # I. 插入默认材料类别选项
-        default_categories = ["办公用品", "工具耗材", "安防劳保", "电器设备", "建筑材料", "油漆涂料", "五金件", "管件", "电缆线材", "其他"]
-        for cat in default_categories:
-            cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", ('CATEGORY', cat))
-            
-        # J. 插入默认专业类别选项 
-        default_domains = ["强电", "弱电", "给排水", "暖通", "土建", "精装", "其他"]
-        for dom in default_domains:
-            cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", ('DOMAIN', dom))
+        # F-J. 插入默认配置选项 (存放位置、项目、单位、材料类别、专业类别)，一次 executemany 完成
+        default_configs = {
+            'LOCATION': ["基地仓库", "大仓库", "别墅", "办公楼", "公寓", "其他"],
+            'PROJECT': ["日常维护", "别墅", "办公楼", "公寓", "基地", "通用"],
+            'UNIT': ["个", "件", "套", "米", "卷", "箱", "KG", "升", "桶", "其他"],
+            'CATEGORY': ["办公用品", "工具耗材", "安防劳保", "电器设备", "建筑材料", "油漆涂料", "五金件", "管件", "电缆线材", "其他"],
+            'DOMAIN': ["强电", "弱电", "给排水", "暖通", "土建", "精装", "其他"],
+        }
+        cursor.executemany(
+            "INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)",
+            [(category, value) for category, values in default_configs.items() for value in values]
+        )
             
+        # 记录结构版本，之后的初始化检查和登录校验只需读取 user_version
+        cursor.execute(f"PRAGMA user_version = {INITIAL_SCHEMA_VERSION}")
+        
+        cursor.execute("COMMIT")
         
-        conn.commit()
+        # K. 收集统计信息，使交易记录等多条件筛选查询的执行计划保持稳定
+        cursor.execute("ANALYZE")
         cursor.close()
         QMessageBox.information(None, "初始化成功", 
                                  f"所有表格已创建，默认管理员 ({DEFAULT_LOGIN_USER}/{DEFAULT_LOGIN_PASS_PLAINTEXT}) 已设置！")
         
     except Exception as e:
-        conn.rollback()
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
         cursor.close()
         QMessageBox.critical(None, "初始化失败", f"创建表格时发生错误。\n错误内容: {e}")
 
 # --- 登录验证 (应用层验证) (保持不变) ---
 
-def validate_user_login(conn, login_user, login_pass_plaintext):
-    """在 admin_user 表中验证登录账号和明文密码。"""
+def get_stored_password(conn, login_user):
+    """读取 admin_user 表中该账号的密码哈希，账号不存在或数据库未初始化时返回 None。"""
     if not conn:
-        return False
+        return None
         
     try:
         cursor = conn.cursor()
         
-        # 确保 admin_user 表存在
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='admin_user'")
-        if cursor.fetchone() is None:
+        # 确保数据库已初始化 (admin_user 表存在)
+        if not is_schema_initialized(cursor):
             QMessageBox.critical(None, "登录失败", "数据库未初始化，请先点击 '初始化数据库' 按钮。")
-            return False
+            return None
 
         query = "SELECT password FROM admin_user WHERE username = ?"
         cursor.execute(query, (login_user,))
         result = cursor.fetchone()
         cursor.close()
         
-        if not result:
-            return False 
-            
-        stored_hashed_password = result[0]
-        
-        # 使用 bcrypt 校验密码
-        return bcrypt.checkpw(login_pass_plaintext.encode('utf-8'), 
-                              stored_hashed_password.encode('utf-8'))
+        return result[0] if result else None
 
     except Exception as e:
         QMessageBox.critical(None, "登录验证错误", f"登录验证时发生错误。\n错误: {e}")
+        return None
+
+def check_password(login_pass_plaintext, stored_hashed_password):
+    """使用 bcrypt 校验明文密码 (计算密集，可在后台线程执行，不涉及任何 UI)。"""
+    return bcrypt.checkpw(login_pass_plaintext.encode('utf-8'), 
+                          stored_hashed_password.encode('utf-8'))
+
+def validate_user_login(conn, login_user, login_pass_plaintext):
+    """在 admin_user 表中验证登录账号和明文密码 (同步执行)。"""
+    stored_hashed_password = get_stored_password(conn, login_user)
+    if stored_hashed_password is None:
         return False
+    return check_password(login_pass_plaintext, stored_hashed_password)
 
 
 # --- PyQt6 应用程序类 (保持不变) ---
@@ -250,6 +278,7 @@ class LoginWindow(QWidget):
         self.setWindowIcon(QIcon(get_resource_path(LOGO_FILENAME)))
 
         self.main_window = None 
+        self._login_task = None # 后台密码校验任务，完成前保持引用
 
         # 2. 确保 db 文件夹存在 (使用 get_base_dir 确定的外部路径)
         self.ensure_db_folder_exists()
@@ -415,10 +444,9 @@ class LoginWindow(QWidget):
     def test_connection_action(self):
         """测试数据库连接：仅验证文件路径是否正确且可连接。"""
         db_path = self.db_path 
-        conn = get_db_connection(db_path, create_if_missing=False) 
+        conn = get_db_connection(db_path, create_if_missing=False, shared=True) 
         
         if conn:
-            conn.close()
             QMessageBox.information(
                 self, 
                 "数据库连接测试成功", 
@@ -446,18 +474,36 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "登录警告", "登录账号和密码不能为空！")
             return
 
-        conn = get_db_connection(db_path, create_if_missing=False) 
+        conn = get_db_connection(db_path, create_if_missing=False, shared=True) 
         if not conn:
             return
 
-        if validate_user_login(conn, login_user, login_pass):
-            conn.close()
-            
+        # 读取密码哈希很快，在 UI 线程完成；bcrypt 校验 (约 100ms 以上) 放到线程池，避免界面卡顿
+        stored_hashed_password = get_stored_password(conn, login_user)
+        
+        if stored_hashed_password is None:
+            QMessageBox.critical(self, "登录失败", "登录账号或密码错误。")
+            return
+        
+        self.login_btn.setEnabled(False)
+        self.login_btn.setText("验证中...")
+        self._login_task = run_in_background(
+            check_password, login_pass, stored_hashed_password,
+            on_finished=lambda ok: self._on_password_checked(ok, login_user),
+            on_failed=self._on_password_check_failed
+        )
+
+    def _on_password_checked(self, ok: bool, login_user: str):
+        """后台密码校验完成 (UI 线程)。"""
+        self._login_task = None
+        self._restore_login_button()
+        
+        if ok:
             self.save_settings()
             QMessageBox.information(self, "登录成功", f"欢迎回来, {login_user}！正在启动系统...")
             
             try:
-                self.main_window = MainWindow(db_path=db_path) 
+                self.main_window = MainWindow(db_path=self.db_path) 
                 self.main_window.show()
                 self.close()
                 
@@ -467,9 +513,18 @@ class LoginWindow(QWidget):
                 QMessageBox.critical(self, "启动错误", f"无法启动主程序: {e}")
                 
         else:
-            conn.close()
             QMessageBox.critical(self, "登录失败", "登录账号或密码错误。")
 
+    def _on_password_check_failed(self, error: str):
+        """后台密码校验抛出异常 (UI 线程)。"""
+        self._login_task = None
+        self._restore_login_button()
+        QMessageBox.critical(self, "登录验证错误", f"登录验证时发生错误。\n错误: {error}")
+
+    def _restore_login_button(self):
+        self.login_btn.setText("登录系统")
+        self.login_btn.setEnabled(True)
+
 
 if __name__ == '__main__':
     # 确保应用程序在运行之前设置了正确的环境
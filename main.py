@@ -14,6 +14,7 @@ from inventory_page import InventoryPage
 from transaction_page import TransactionPage 
 # [修改] 导入新的设置工具 Widget
 from settings_widget import SettingsWidget 
+import db_manager
 
 # --- 资源路径处理函数 ---
 # 定义 Logo 文件名（假设您的 Logo 文件名为 logo.png）
@@ -39,6 +40,8 @@ class MainWindow(QMainWindow):
         super().__init__()
         # 接收从 login.py 传递来的数据库路径
         self.db_path = db_path 
+        # 旧数据库结构迁移 (如交易记录外键级联删除)，已是最新版本时直接返回
+        db_manager.migrate_database(self.db_path)
         self.setWindowTitle("仓库管理系统 (Honsen Africa CI) - 主程序")
         self.setGeometry(100, 100, 1200, 800)
         
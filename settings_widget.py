@@ -10,6 +10,7 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont, QIcon 
+from db_worker import run_in_background
 
 try:
     import db_manager 
@@ -19,15 +20,23 @@ except ImportError:
     class MockDBManager:
         def get_inventory_for_export(self, db_path): return []
         def get_transactions_for_export(self, db_path): return []
+        def iter_inventory_for_export(self, db_path): return iter([])
+        def iter_transactions_for_export(self, db_path): return iter([])
         def batch_import_inventory(self, db_path, items): return {'inserted': 0, 'updated': 0, 'failed': 0}
+        def invalidate_config_cache(self, category=None): pass
     db_manager = MockDBManager()
 
     class MockDataUtility:
         def export_to_csv(self, data, filepath, headers): return True
+        def export_rows_to_csv(self, rows, filepath, headers): return 0
         def import_from_csv(self, filepath): return []
     data_utility = MockDataUtility()
     pass
 
+def _export_csv(iter_rows, db_path, filepath, headers):
+    """在后台线程中执行：从数据库游标逐行读取并直接写入 CSV，返回写入行数 (-1 表示写入失败)。"""
+    return data_utility.export_rows_to_csv(iter_rows(db_path), filepath, headers)
+
 def get_db_connection(db_path):
     """建立 SQLite 连接。"""
     try:
@@ -86,6 +95,7 @@ class ConfigurationPage(QWidget):
             cursor.execute("INSERT OR IGNORE INTO config (category, value) VALUES (?, ?)", (category, value))
                 
             conn.commit()
+            db_manager.invalidate_config_cache(category) # 使各对话框的下拉选项缓存失效
             return cursor.rowcount > 0 
         except sqlite3.Error as e:
             print(f"数据库插入错误 (insert_config for {category}): {e}")
@@ -108,6 +118,7 @@ class ConfigurationPage(QWidget):
             cursor.execute("DELETE FROM config WHERE category = ? AND value = ?", (category, value))
                 
             conn.commit()
+            db_manager.invalidate_config_cache(category) # 使各对话框的下拉选项缓存失效
             return cursor.rowcount > 0
         except sqlite3.Error as e:
             print(f"数据库删除错误 (remove_config for {category}): {e}")
@@ -304,6 +315,8 @@ class DataManagementPage(QWidget):
         super().__init__(parent)
         self.db_path = db_path
         self.refresh_inventory_callback = refresh_inventory_callback
+        self._export_tasks = {} # 按钮 -> 后台导出任务，完成前保持引用
+        self._import_task = None # 后台导入任务，完成前保持引用
         self.init_ui()
 
     def init_ui(self):
@@ -370,28 +383,43 @@ class DataManagementPage(QWidget):
         filepath, _ = QFileDialog.getSaveFileName(self, "导出库存清单", "inventory_export.csv", "CSV Files (*.csv)")
         
         if filepath:
-            # 假设 db_manager.get_inventory_for_export 能够正确获取 domain 字段
-            data = db_manager.get_inventory_for_export(self.db_path)
             # 保持 headers 不变，因为这是导出 inventory 数据的结构，与 config 表结构无关
             headers = ["name", "reference", "category", "domain", "unit", "current_stock", "min_stock", "location"] 
-            
-            if data_utility.export_to_csv(data, filepath, headers):
-                QMessageBox.information(self, "导出成功", f"库存清单已成功导出到:\n{filepath}")
-            else:
-                QMessageBox.critical(self, "导出失败", "写入文件时发生错误。")
+            self._start_export(self.export_inv_btn, db_manager.iter_inventory_for_export, filepath, headers, "库存清单")
 
     def export_transactions_action(self):
         """导出交易记录到 CSV 文件"""
         filepath, _ = QFileDialog.getSaveFileName(self, "导出交易记录", "transactions_export.csv", "CSV Files (*.csv)")
         
         if filepath:
-            data = db_manager.get_transactions_for_export(self.db_path)
             headers = ["date", "type", "quantity", "recipient_source", "project_ref", "item_name", "item_reference", "item_domain"]
-            
-            if data_utility.export_to_csv(data, filepath, headers):
-                QMessageBox.information(self, "导出成功", f"交易记录已成功导出到:\n{filepath}")
-            else:
-                QMessageBox.critical(self, "导出失败", "写入文件时发生错误。")
+            self._start_export(self.export_tx_btn, db_manager.iter_transactions_for_export, filepath, headers, "交易记录")
+
+    def _start_export(self, button, iter_rows, filepath, headers, title):
+        """在线程池中流式导出 (边查询边写文件)，期间禁用对应按钮"""
+        button.setEnabled(False)
+        self._export_tasks[button] = run_in_background(
+            _export_csv, iter_rows, self.db_path, filepath, headers,
+            on_finished=lambda count: self._on_export_finished(button, count, filepath, title),
+            on_failed=lambda error: self._on_export_failed(button, error)
+        )
+
+    def _on_export_finished(self, button, count, filepath, title):
+        """后台导出完成 (UI 线程)。"""
+        self._export_tasks.pop(button, None)
+        button.setEnabled(True)
+        if count > 0:
+            QMessageBox.information(self, "导出成功", f"{title}已成功导出到:\n{filepath}")
+        elif count == 0:
+            QMessageBox.warning(self, "导出失败", f"没有可导出的{title}。")
+        else:
+            QMessageBox.critical(self, "导出失败", "读取数据或写入文件时发生错误。")
+
+    def _on_export_failed(self, button, error):
+        """后台导出抛出异常 (UI 线程)。"""
+        self._export_tasks.pop(button, None)
+        button.setEnabled(True)
+        QMessageBox.critical(self, "导出失败", f"导出时发生错误：{error}")
 
     def import_inventory_action(self):
         """从 CSV 文件导入或更新库存清单"""
@@ -419,7 +447,18 @@ class DataManagementPage(QWidget):
             QMessageBox.warning(self, "导入警告", "文件内容为空或格式不正确，没有可导入的数据。")
             return
         
-        stats = db_manager.batch_import_inventory(self.db_path, items_to_import)
+        # 写入在后台线程执行 (提交时的 fsync 不阻塞 UI)，期间禁用导入按钮
+        self.import_inv_btn.setEnabled(False)
+        self._import_task = run_in_background(
+            db_manager.batch_import_inventory, self.db_path, items_to_import,
+            on_finished=self._on_import_finished,
+            on_failed=self._on_import_failed
+        )
+
+    def _on_import_finished(self, stats):
+        """后台导入完成 (UI 线程)。"""
+        self._import_task = None
+        self.import_inv_btn.setEnabled(True)
         
         message = (
             f"库存批量导入操作完成:\n\n"
@@ -436,6 +475,12 @@ class DataManagementPage(QWidget):
         if self.refresh_inventory_callback:
             self.refresh_inventory_callback()
 
+    def _on_import_failed(self, error):
+        """后台导入抛出异常 (UI 线程)。"""
+        self._import_task = None
+        self.import_inv_btn.setEnabled(True)
+        QMessageBox.critical(self, "导入错误", f"导入时发生错误：{error}")
+
 
 class SettingsWidget(QWidget):
     """主设置窗口"""
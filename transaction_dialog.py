@@ -12,6 +12,7 @@ from datetime import datetime
 # 确保导入 db_manager 和 BatchTransactionDialog
 import db_manager 
 from batch_transaction_dialog import BatchTransactionDialog 
+from db_worker import run_in_background
 
 class TransactionDialog(QDialog):
     
@@ -24,6 +25,7 @@ class TransactionDialog(QDialog):
         # 初始加载数据
         self.all_inventory_items: List[Dict] = db_manager.get_all_inventory(self.db_path)
         self.filtered_items: List[Dict] = self.all_inventory_items.copy()
+        self._save_task = None # 进行中的后台写入任务
         
         self.init_ui()
 
@@ -157,24 +159,24 @@ class TransactionDialog(QDialog):
             self.domain_filter.addItem("无可用专业") 
             return
         
-        categories = set(item.get('category', '').strip() for item in self.all_inventory_items if item.get('category'))
-        domains = set(item.get('domain', '').strip() for item in self.all_inventory_items if item.get('domain'))
-        locations = set(item.get('location', '').strip() for item in self.all_inventory_items if item.get('location'))
+        categories = {value for item in self.all_inventory_items if (value := (item.get('category') or '').strip())}
+        domains = {value for item in self.all_inventory_items if (value := (item.get('domain') or '').strip())}
+        locations = {value for item in self.all_inventory_items if (value := (item.get('location') or '').strip())}
 
         self.category_filter.addItem("全部类别")
-        self.category_filter.addItems(sorted(list(categories)))
+        self.category_filter.addItems(sorted(categories))
         if current_category:
             index = self.category_filter.findText(current_category)
             if index >= 0: self.category_filter.setCurrentIndex(index)
         
         self.domain_filter.addItem("全部专业")
-        self.domain_filter.addItems(sorted(list(domains)))
+        self.domain_filter.addItems(sorted(domains))
         if current_domain:
             index = self.domain_filter.findText(current_domain)
             if index >= 0: self.domain_filter.setCurrentIndex(index)
         
         self.location_filter.addItem("全部地点")
-        self.location_filter.addItems(sorted(list(locations)))
+        self.location_filter.addItems(sorted(locations))
         if current_location:
             index = self.location_filter.findText(current_location)
             if index >= 0: self.location_filter.setCurrentIndex(index)
@@ -242,11 +244,20 @@ class TransactionDialog(QDialog):
         project_ref = ""
         if self.type == 'OUT': project_ref = self.project_combo.currentText()
 
-        success = db_manager.record_transaction(
+        # 写入在后台线程执行 (提交时的 fsync 不阻塞 UI)，期间禁用按钮
+        self._set_saving(True)
+        self._save_task = run_in_background(
+            db_manager.record_transaction,
             db_path=self.db_path, item_id=item_id, type=self.type, quantity=quantity, date=current_datetime,
-            recipient_source=recipient_source, project_ref=project_ref
+            recipient_source=recipient_source, project_ref=project_ref,
+            on_finished=self._on_save_finished,
+            on_failed=self._on_save_failed
         )
-        
+
+    def _on_save_finished(self, success: bool):
+        """后台写入完成 (UI 线程)。"""
+        self._save_task = None
+        self._set_saving(False)
         if success:
             QMessageBox.information(self, "成功", f"成功记录 {self.type} 交易，库存已更新。")
             # 成功后，刷新父窗口的库存数据并关闭自身
@@ -254,4 +265,26 @@ class TransactionDialog(QDialog):
             # super().accept() # 移除此行，因为 _refresh_inventory_data 已经调用了 accept()
         else:
             QMessageBox.critical(self, "操作失败", "记录交易失败！可能是出库数量超过当前库存，或数据库发生其他错误。")
-            return
\ No newline at end of file
+
+    def _on_save_failed(self, error: str):
+        """后台写入抛出异常 (UI 线程)。"""
+        self._save_task = None
+        self._set_saving(False)
+        QMessageBox.critical(self, "操作失败", f"记录交易失败！错误：{error}")
+
+    def _set_saving(self, saving: bool):
+        self.buttonBox.setEnabled(not saving)
+        self.batch_button.setEnabled(not saving)
+
+    def reject(self):
+        # 后台写入进行中时忽略 Esc / 取消，否则写入已提交而调用方却收到 Rejected
+        if self._save_task is not None:
+            return
+        super().reject()
+
+    def closeEvent(self, event):
+        # 后台写入进行中时忽略窗口关闭按钮
+        if self._save_task is not None:
+            event.ignore()
+            return
+        super().closeEvent(event)
\ No newline at end of file
@@ -8,7 +8,7 @@ from PyQt6.QtWidgets import (
     QDateEdit, QComboBox, QFileDialog
 )
 from PyQt6.QtCore import Qt, QDateTime, QDate 
-from PyQt6.QtGui import QColor
+from PyQt6.QtGui import QColor, QBrush
 from typing import Optional, List, Dict, Union 
 
 # 导入数据库管理器和交易对话框
@@ -16,16 +16,33 @@ import db_manager
 from transaction_dialog import TransactionDialog
 from edit_transaction_dialog import EditTransactionDialog
 
+# 行背景画刷 (模块常量，所有单元格共享)
+BRUSH_IN = QBrush(QColor(230, 255, 230))       # 浅绿色 (原色)
+BRUSH_OUT = QBrush(QColor(255, 230, 230))      # 浅红色 (原色)
+BRUSH_REVERSAL = QBrush(QColor(255, 255, 204)) # 浅黄色 (冲销)
+
+def _int_item(value: int) -> QTableWidgetItem:
+    """以 int 存储 DisplayRole 的单元格：排序按数值比较，读取时无需 int(text) 转换"""
+    item = QTableWidgetItem()
+    item.setData(Qt.ItemDataRole.DisplayRole, value)
+    return item
+
+
 class TransactionPage(QWidget):
     """
     交易记录界面：展示 Transactions 表数据，并提供筛选、入库/出库、修改、冲销和删除操作。
     增加了类别、地点、项目和专业筛选和底部统计功能，以及导出功能。
     """
+    # 各列默认宽度 (像素)；型号/规格列 (2) 自动拉伸
+    COLUMN_WIDTHS = {0: 160, 1: 300, 3: 80, 4: 120, 5: 80, 6: 110, 7: 140, 8: 120}
+    ROW_HEIGHT = 24 # 行高 (像素)
+
     def __init__(self, db_path: str, inventory_page_ref): 
         super().__init__()
         self.db_path = db_path
         self.inventory_page_ref = inventory_page_ref
         self.current_data: List[Dict[str, Union[int, str]]] = []
+        self._combo_options = {} # 各筛选下拉框当前的选项 (不含 ALL)
         self.init_ui()
         self.load_transaction_data()
 
@@ -151,24 +168,27 @@ class TransactionPage(QWidget):
         self.transaction_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         self.transaction_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection) 
 
-        # 定义新的表头顺序：数量 (7) 移到 物品型号/规格 (3) 后面，作为第 4 列
-        # 新顺序: ID(0), 日期/时间(1), 物品名称(2), 物品型号/规格(3), 物品数量(4), 储存位置(5), 专业(6), 物品类型(7), 接收人/来源(8), 出库项目(9)
+        # 表头顺序: 日期/时间(0), 物品名称(1), 物品型号/规格(2), 物品数量(3), 储存位置(4), 专业(5), 物品类型(6), 接收人/来源(7), 出库项目(8)
+        # 交易 ID 不占表格列，第 i 行对应 self.current_data[i]
         self.headers = [
-            "ID", "日期/时间", "      物品名称     ", "物品型号/规格", 
+            "日期/时间", "      物品名称     ", "物品型号/规格", 
             "物品数量",  # <--- 移动到这里
             "储存位置", "专业", "物品类型", "接收人/来源", "出库项目"
         ]
         self.transaction_table.setColumnCount(len(self.headers))
         self.transaction_table.setHorizontalHeaderLabels(self.headers)
         
-        # 调整列宽
-        self.transaction_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        self.transaction_table.horizontalHeader().resizeSection(1, 160) # 日期
-        self.transaction_table.horizontalHeader().resizeSection(2, 300) # 名称
-        self.transaction_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch) # 型号/规格
-        self.transaction_table.horizontalHeader().resizeSection(4, 80) # 数量 (新位置)
-        self.transaction_table.horizontalHeader().resizeSection(5, 120) # 储存位置 (新位置)
-        # 其余列使用 ResizeToContents 或默认
+        # 调整列宽：固定初始宽度 (Interactive，用户可拖动)，不使用 ResizeToContents，
+        # 避免每次重新填充表格都逐个单元格测量文本宽度
+        header = self.transaction_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        for col, width in self.COLUMN_WIDTHS.items():
+            header.resizeSection(col, width)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch) # 型号/规格
+        # 固定行高，填充和滚动时无需逐行测量高度
+        vertical_header = self.transaction_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        vertical_header.setDefaultSectionSize(self.ROW_HEIGHT)
         
         main_layout.addWidget(self.transaction_table)
         
@@ -226,97 +246,30 @@ class TransactionPage(QWidget):
         )
     
     def _refresh_filter_dropdowns(self):
-        """刷新筛选下拉框的选项（从实际库存数据中提取）"""
-        # 保存当前选择
-        current_category = self.category_filter_combo.currentText()
-        current_domain = self.domain_filter_combo.currentText()  # 新增
-        current_location = self.location_filter_combo.currentText()
-        current_project = self.project_filter_combo.currentText()
-        
-        try:
-            # ⭐ 从数据库获取所有库存物品
-            all_inventory = db_manager.get_all_inventory(self.db_path)
-            if all_inventory is None:
-                all_inventory = []
-            
-            # ⭐ 从库存中提取所有唯一的类别
-            categories = set()
-            for item in all_inventory:
-                category = item.get('category', '').strip()
-                if category:
-                    categories.add(category)
-            category_options = ["ALL"] + sorted(list(categories))
-            
-            # ⭐ 从库存中提取所有唯一的专业（新增）
-            domains = set()
-            for item in all_inventory:
-                domain = item.get('domain', '').strip()
-                if domain:
-                    domains.add(domain)
-            domain_options = ["ALL"] + sorted(list(domains))
-            
-            # ⭐ 从库存中提取所有唯一的地点
-            locations = set()
-            for item in all_inventory:
-                location = item.get('location', '').strip()
-                if location:
-                    locations.add(location)
-            location_options = ["ALL"] + sorted(list(locations))
-            
-            # ⭐ 从交易记录中提取所有唯一的项目
-            all_transactions = db_manager.get_transactions_history(self.db_path)
-            if all_transactions is None:
-                all_transactions = []
-            
-            projects = set()
-            for tx in all_transactions:
-                project = tx.get('project_ref', '').strip()
-                # 排除冲销记录和空值
-                if project and not project.startswith('Reversed TX:'):
-                    projects.add(project)
-            project_options = ["ALL"] + sorted(list(projects))
-            
-        except Exception as e:
-            print(f"刷新筛选选项时出错: {e}")
-            # 出错时使用默认值
-            category_options = ["ALL"]
-            domain_options = ["ALL"]  # 新增
-            location_options = ["ALL"]
-            project_options = ["ALL"]
-        
-        # 更新类别下拉框
-        self.category_filter_combo.clear()
-        self.category_filter_combo.addItems(category_options)
-        
-        # 更新专业下拉框（新增）
-        self.domain_filter_combo.clear()
-        self.domain_filter_combo.addItems(domain_options)
-        
-        # 更新地点下拉框
-        self.location_filter_combo.clear()
-        self.location_filter_combo.addItems(location_options)
-        
-        # 更新项目下拉框
-        self.project_filter_combo.clear()
-        self.project_filter_combo.addItems(project_options)
-        
-        # 尝试恢复之前的选择
-        cat_index = self.category_filter_combo.findText(current_category)
-        if cat_index >= 0:
-            self.category_filter_combo.setCurrentIndex(cat_index)
-        
-        # 恢复专业选择（新增）
-        dom_index = self.domain_filter_combo.findText(current_domain)
-        if dom_index >= 0:
-            self.domain_filter_combo.setCurrentIndex(dom_index)
-        
-        loc_index = self.location_filter_combo.findText(current_location)
-        if loc_index >= 0:
-            self.location_filter_combo.setCurrentIndex(loc_index)
-        
-        proj_index = self.project_filter_combo.findText(current_project)
-        if proj_index >= 0:
-            self.project_filter_combo.setCurrentIndex(proj_index)
+        """刷新筛选下拉框的选项 (类别、专业、地点来自库存表，项目来自交易记录，均由数据库去重)"""
+        options = db_manager.get_inventory_filter_options(self.db_path)
+        
+        self._update_filter_combo(self.category_filter_combo, options['category'])
+        self._update_filter_combo(self.domain_filter_combo, options['domain'])
+        self._update_filter_combo(self.location_filter_combo, options['location'])
+        self._update_filter_combo(self.project_filter_combo, db_manager.get_project_options(self.db_path))
+
+    def _update_filter_combo(self, combo: QComboBox, values):
+        """选项与上次相同时不重建下拉框；否则重建并保留当前选择"""
+        values = tuple(values)
+        if self._combo_options.get(combo) == values:
+            return
+        self._combo_options[combo] = values
+        
+        current = combo.currentText()
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItem("ALL")
+        combo.addItems(values)
+        index = combo.findText(current)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        combo.blockSignals(False)
         
     def load_transaction_data(self):
         """初始加载数据"""
@@ -385,49 +338,47 @@ class TransactionPage(QWidget):
         )
         # ----------------------
 
-        self.transaction_table.setRowCount(len(data))
-        
-        # 定义颜色常量
-        COLOR_IN = QColor(230, 255, 230)      # 浅绿色 (原色)
-        COLOR_OUT = QColor(255, 230, 230)     # 浅红色 (原色)
-        # 修改 3: 浅黄色作为冲销色
-        COLOR_REVERSAL = QColor(255, 255, 204) # 浅黄色 
+        # 批量填充期间关闭重绘、排序和信号，填充完成后一次性刷新
+        table = self.transaction_table
+        sorting_enabled = table.isSortingEnabled()
+        table.setUpdatesEnabled(False)
+        table.setSortingEnabled(False)
+        table.blockSignals(True)
+        try:
+            table.setRowCount(len(data))
+            # 循环内频繁调用的方法绑定为局部变量，省去每个单元格的属性查找
+            set_item = table.setItem
+            new_item = QTableWidgetItem
         
-        for row_index, tx in enumerate(data):
+            for row_index, tx in enumerate(data):
             
-            tx_type_upper = tx['type'].upper()
-            is_out = tx_type_upper == 'OUT'
-            # 修改 3: 检查是否是任何冲销类型
-            is_reversal = tx_type_upper.startswith('REVERSAL')
-            
-            # 填充表格行（新列顺序：数量(4) 移到 型号(3) 后面）
-            # 新顺序: ID(0), 日期/时间(1), 物品名称(2), 物品型号/规格(3), 物品数量(4), 储存位置(5), 专业(6), 物品类型(7), 接收人/来源(8), 出库项目(9)
-            # 原始数据键索引: 'id', 'date', 'item_name', 'item_ref', 'location', 'domain', 'type', 'quantity', 'recipient_source', 'project_ref'
-            self.transaction_table.setItem(row_index, 0, QTableWidgetItem(str(tx['id'])))
-            self.transaction_table.setItem(row_index, 1, QTableWidgetItem(tx['date']))
-            self.transaction_table.setItem(row_index, 2, QTableWidgetItem(tx['item_name']))
-            self.transaction_table.setItem(row_index, 3, QTableWidgetItem(tx['item_ref']))
-            
-            self.transaction_table.setItem(row_index, 4, QTableWidgetItem(str(tx['quantity']))) # <--- 数量移到第 4 列
+                tx_type_upper = tx['type'].upper()
+                is_out = tx_type_upper == 'OUT'
+                # 修改 3: 检查是否是任何冲销类型
+                is_reversal = tx_type_upper.startswith('REVERSAL')
             
-            self.transaction_table.setItem(row_index, 5, QTableWidgetItem(tx['location'])) # <--- 储存位置移到第 5 列
-            self.transaction_table.setItem(row_index, 6, QTableWidgetItem(tx.get('domain', '')))  # <--- 专业移到第 6 列
-            self.transaction_table.setItem(row_index, 7, QTableWidgetItem(tx['type'])) # <--- 类型移到第 7 列
-            self.transaction_table.setItem(row_index, 8, QTableWidgetItem(tx['recipient_source'])) # <--- 接收人/来源移到第 8 列
-            self.transaction_table.setItem(row_index, 9, QTableWidgetItem(tx['project_ref'])) # <--- 项目移到第 9 列
+                # 行颜色
+                if is_reversal:
+                    color = BRUSH_REVERSAL # 冲销记录：浅黄色
+                elif is_out:
+                    color = BRUSH_OUT      # 出库记录：浅红色
+                else:
+                    color = BRUSH_IN       # 入库记录：浅绿色 (IN 或 REVERSAL-OUT)
             
-            # 设置行颜色
-            if is_reversal:
-                color = COLOR_REVERSAL # 冲销记录：浅黄色
-            elif is_out:
-                color = COLOR_OUT      # 出库记录：浅红色
-            else:
-                color = COLOR_IN       # 入库记录：浅绿色 (IN 或 REVERSAL-OUT)
-
-            for col in range(self.transaction_table.columnCount()):
-                self.transaction_table.item(row_index, col).setBackground(color)
-
-            self.transaction_table.setColumnHidden(0, True)
+                # 填充表格行 (列顺序见 init_ui 中的表头定义)；背景直接设置在新建的单元格上，
+                # 不再通过 table.item() 二次取回
+                cells = (
+                    new_item(tx['date']), new_item(tx['item_name']), new_item(tx['item_ref']),
+                    _int_item(tx['quantity']), new_item(tx['location']), new_item(tx.get('domain', '')),
+                    new_item(tx['type']), new_item(tx['recipient_source']), new_item(tx['project_ref']),
+                )
+                for col, cell in enumerate(cells):
+                    cell.setBackground(color)
+                    set_item(row_index, col, cell)
+        finally:
+            table.blockSignals(False)
+            table.setSortingEnabled(sorting_enabled)
+            table.setUpdatesEnabled(True)
 
         # 更新状态栏
         self.status_label.setText(stats_msg) 
@@ -435,6 +386,13 @@ class TransactionPage(QWidget):
     # ----------------------------------------
     # --- 交易操作逻辑 ---
     # ----------------------------------------
+
+    def _selected_transaction(self) -> Optional[Dict[str, Union[int, str]]]:
+        """返回选中行对应的交易记录字典 (表格行与 self.current_data 一一对应)，未选中时返回 None"""
+        selected_rows = self.transaction_table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        return self.current_data[selected_rows[0].row()]
             
     def open_transaction_dialog(self, type: str):
         """打开入库或出库对话框"""
@@ -452,15 +410,13 @@ class TransactionPage(QWidget):
             
     def reverse_transaction_action(self):
         """冲销选中交易的槽函数"""
-        selected_rows = self.transaction_table.selectionModel().selectedRows()
-        if not selected_rows:
+        tx = self._selected_transaction()
+        if tx is None:
             QMessageBox.warning(self, "警告", "请先选择要冲销的交易记录。")
             return
             
-        row_index = selected_rows[0].row()
-        tx_id = int(self.transaction_table.item(row_index, 0).text())
-        # 更新列索引：类型(type) 变为 7
-        tx_type = self.transaction_table.item(row_index, 7).text() 
+        tx_id = tx['id']
+        tx_type = tx['type']
         
         # 修改 4: 检查是否是任何冲销类型
         if tx_type.startswith('REVERSAL'):
@@ -486,15 +442,13 @@ class TransactionPage(QWidget):
 
     def edit_transaction_action(self):
         """修改选中交易记录的槽函数（新增）"""
-        selected_rows = self.transaction_table.selectionModel().selectedRows()
-        if not selected_rows:
+        tx = self._selected_transaction()
+        if tx is None:
             QMessageBox.warning(self, "警告", "请先选择要修改的交易记录。")
             return
             
-        row_index = selected_rows[0].row()
-        tx_id = int(self.transaction_table.item(row_index, 0).text())
-        # 更新列索引：类型(type) 变为 7
-        tx_type = self.transaction_table.item(row_index, 7).text() 
+        tx_id = tx['id']
+        tx_type = tx['type']
         
         # 修改 5: 检查是否是任何冲销类型
         if tx_type.startswith('REVERSAL'):
@@ -516,19 +470,16 @@ class TransactionPage(QWidget):
 
     def delete_transaction_action(self):
         """删除选中交易记录的槽函数（新增）"""
-        selected_rows = self.transaction_table.selectionModel().selectedRows()
-        if not selected_rows:
+        tx = self._selected_transaction()
+        if tx is None:
             QMessageBox.warning(self, "警告", "请先选择要删除的交易记录。")
             return
             
-        row_index = selected_rows[0].row()
-        tx_id = int(self.transaction_table.item(row_index, 0).text())
-        # 更新列索引：类型(type) 变为 7
-        tx_type = self.transaction_table.item(row_index, 7).text() 
-        tx_date = self.transaction_table.item(row_index, 1).text()
-        item_name = self.transaction_table.item(row_index, 2).text()
-        # 更新列索引：数量(quantity) 变为 4
-        quantity = self.transaction_table.item(row_index, 4).text() 
+        tx_id = tx['id']
+        tx_type = tx['type']
+        tx_date = tx['date']
+        item_name = tx['item_name']
+        quantity = tx['quantity']
         
         # 构建详细的确认信息
         if tx_type == 'IN':